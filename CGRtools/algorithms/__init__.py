@@ -21,8 +21,11 @@
 """
 implements Molecules and CGRs analysis and representation algorithms
 """
-from .morgan import get_morgan
+from .fingerprints import (get_fingerprint, get_fingerprint_batch, iter_fingerprint_batch, get_fragments,
+                           screen_substructure)
+from .isomorphism import SubgraphMatcher, MultiSubgraphMatcher, symmetry_conditions
+from .morgan import get_morgan, get_morgans, get_morgan_batch
 from .sssr import find_sssr
 from .strings import hash_cgr_string, CGRstring
 from .valence import Valence
-from .stereo import pyramid_volume
+from .stereo import pyramid_volume, pyramid_volumes
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2018 Ramil Nugmanov <stsouko@live.ru>
+#  This file is part of CGRtools.
+#
+#  CGRtools is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+"""
+hashed fragments fingerprints of Molecules and CGRs packed into NumPy uint64 arrays.
+
+molecules fragments are equal to fragments of CGRs without changes.
+dynamic atoms and bonds of CGRs are hashed with reagents and products marks.
+"""
+from importlib.util import find_spec
+from itertools import islice
+from .morgan import _fold, _mix
+from ..exceptions import InvalidConfig
+from ..periodictable import elements
+
+
+def get_fingerprint(g, length=1024, linear=7, circular=2, bits=2):
+    """
+    hashed fingerprint of structure
+
+    :param g: (CGR|Molecule)Container
+    :param length: number of bits in fingerprint. should be multiple of 64
+    :param linear: maximal number of atoms in linear fragments. 0 - disable linear fragments
+    :param circular: maximal radius of circular fragments. 0 - only atoms. -1 - disable circular fragments.
+                     circular fragments unusable for substructure screening
+    :param bits: number of bits set by each fragment
+    :return: NumPy uint64 array of length / 64 words
+    """
+    return get_fingerprint_batch([g], length, linear, circular, bits)[0]
+
+
+def get_fingerprint_batch(graphs, length=1024, linear=7, circular=2, bits=2):
+    """
+    hashed fingerprints of many structures. see get_fingerprint
+
+    :param graphs: iterable of (CGR|Molecule)Containers
+    :return: NumPy uint64 array of shape (len(graphs), length / 64)
+    """
+    _check(length)
+    positions = [sorted(get_fragments(g, linear, circular, bits, length)) for g in graphs]
+    out = _np.zeros((len(positions), length), dtype=bool)
+    for i, x in enumerate(positions):
+        out[i, x] = True
+    return _np.packbits(out, axis=1, bitorder='little').view(_np.uint64)
+
+
+def iter_fingerprint_batch(graphs, chunk=1024, length=1024, linear=7, circular=2, bits=2):
+    """
+    hashed fingerprints of structures stream. see get_fingerprint
+
+    :param graphs: iterable of (CGR|Molecule)Containers. for example RDFread or SDFread
+    :param chunk: number of structures in batch
+    :return: generator of NumPy uint64 arrays of shape (chunk, length / 64). last array can be smaller
+    """
+    _check(length)
+    graphs = iter(graphs)
+    while True:
+        batch = list(islice(graphs, chunk))
+        if not batch:
+            break
+        yield get_fingerprint_batch(batch, length, linear, circular, bits)
+
+
+def get_fragments(g, linear=7, circular=2, bits=2, length=None, atom_marks=None, bond_marks=None, query=False):
+    """
+    hashes of linear and circular fragments of structure. see get_fingerprint
+
+    :param length: if not None, hashes folded into bits positions
+    :param atom_marks: if not None, only given atoms attributes are hashed. for example ('element', 's_charge')
+    :param bond_marks: if not None, only given bonds attributes are hashed. for example ('s_bond',)
+    :param query: structure is query. atoms and bonds with None or list values of marks are not used in fragments
+    :return: set of 64bit hashes or bits positions
+    """
+    if atom_marks is None:
+        atoms = {n: _fold((elements.index(attr['element']), attr.get('isotope') or 0,
+                           attr['s_charge'], attr.get('p_charge', attr['s_charge']),
+                           attr.get('s_radical') or 0, attr.get('p_radical', attr.get('s_radical')) or 0))
+                 for n, attr in g.nodes(data=True)}
+    else:
+        atoms = {n: _fold(tuple(_code(x) for x in v)) for n, v in
+                 ((n, tuple(attr.get(x) for x in atom_marks)) for n, attr in g.nodes(data=True))
+                 if not query or not any(x is None or isinstance(x, list) for x in v)}
+
+    if bond_marks is None:
+        adj = {n: {m: 10 * (attr.get('s_bond') or 0) + (attr.get('p_bond', attr.get('s_bond')) or 0)
+                   for m, attr in nbrs.items() if m in atoms} for n, nbrs in g.adjacency() if n in atoms}
+    else:
+        adj = {n: {m: _fold(tuple(_code(x) for x in v)) for m, v in
+                   ((m, tuple(attr.get(x) for x in bond_marks)) for m, attr in nbrs.items() if m in atoms)
+                   if not query or not any(x is None or isinstance(x, list) for x in v)}
+               for n, nbrs in g.adjacency() if n in atoms}
+
+    hashes = set()
+    if linear:
+        for n in atoms:
+            stack = [(n, (atoms[n],), {n})]
+            while stack:
+                m, path, seen = stack.pop()
+                hashes.add(_fold((1,) + min(path, path[::-1])))
+                if len(seen) < linear:
+                    for x, b in adj[m].items():
+                        if x not in seen:
+                            stack.append((x, path + (b, atoms[x]), seen | {x}))
+
+    if circular >= 0:
+        colors = atoms
+        hashes.update(_fold((2, 0, x)) for x in colors.values())
+        for r in range(1, circular + 1):
+            colors = {n: _fold((colors[n],) + tuple(sorted(_fold((b, colors[m])) for m, b in adj[n].items())))
+                      for n in colors}
+            hashes.update(_fold((2, r, x)) for x in colors.values())
+
+    if length is None:
+        return hashes
+
+    positions = set()
+    for h in hashes:
+        for _ in range(bits):
+            positions.add(h % length)
+            h = _mix(h)
+    return positions
+
+
+def screen_substructure(query, fingerprints):
+    """
+    substructure screening. query structure can be substructure only of fingerprints with all bits of query.
+    fingerprints should be generated without circular fragments
+
+    :param query: NumPy uint64 array of query fingerprint
+    :param fingerprints: NumPy uint64 array of shape (number of structures, words)
+    :return: NumPy bool array of possible superstructures
+    """
+    return (_np.bitwise_and(fingerprints, query) == query).all(axis=1)
+
+
+def _code(x):
+    if x is None:
+        return _none
+    if isinstance(x, int):
+        return x
+    if isinstance(x, tuple):
+        return _fold(tuple(_code(y) for y in x))
+    return _fold(tuple(str(x).encode()))
+
+
+def _check(length):
+    if _np is None:
+        raise InvalidConfig('NumPy required for fingerprints')
+    if length <= 0 or length % 64:
+        raise InvalidConfig('fingerprint length should be multiple of 64')
+
+
+_none = 0x9E3779B97F4A7C15
+
+if find_spec('numpy'):
+    import numpy as _np
+else:
+    _np = None
@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2018 Ramil Nugmanov <stsouko@live.ru>
+#  This file is part of CGRtools.
+#
+#  CGRtools is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+from collections import defaultdict
+from itertools import chain
+from operator import itemgetter
+
+
+class SubgraphMatcher:
+    """
+    VF2++ like matcher of node induced subgraphs of Molecules and CGRs.
+    drop-in replacement of networkx GraphMatcher subgraph isomorphism search.
+
+    atoms and bonds attributes are compiled into integer classes. attributes are compared only once for each pair
+    of structure and pattern classes. pattern atoms are matched in order of rarity of candidates with preference
+    of atoms connected to already matched.
+    """
+    def __init__(self, g, h, node_marks, edge_marks, query=True, automorphic=True):
+        """
+        :param g: (CGR|Molecule)Container. structure
+        :param h: (CGR|Molecule)Container. pattern
+        :param node_marks: compared atoms attributes
+        :param edge_marks: compared bonds attributes
+        :param query: if True None value of pattern attribute match any value and list match any value from list.
+                      otherwise attributes compared by equality
+        :param automorphic: if True all mappings generated. otherwise only one mapping for each set of structure atoms.
+                            mappings equal up to pattern automorphisms are pruned by symmetry breaking conditions
+        """
+        self.__g = g
+        self.__h = h
+        self.__node_marks = tuple(node_marks)
+        self.__edge_marks = tuple(edge_marks)
+        self.__eq = _list_eq if query else _eq
+        self.__automorphic = automorphic
+        self.__compiled = False
+
+    def subgraph_is_isomorphic(self):
+        """
+        check existence of pattern in structure
+
+        :return: bool
+        """
+        return next(self.subgraph_isomorphisms_iter(), None) is not None
+
+    def subgraph_isomorphisms_iter(self):
+        """
+        iterate over all mappings of structure subgraphs isomorphic to pattern
+
+        :return: generator of dicts of structure atom: pattern atom
+        """
+        plan = self.__get_plan()
+        if plan is None:
+            return
+        if not plan:
+            yield {}
+            return
+
+        adj = self.__g_adj
+        size = len(plan)
+        mapping = []
+        used = set()
+        seen = None if self.__automorphic else set()
+
+        stack = [self.__candidates(plan[0], mapping, used)]
+        while stack:
+            depth = len(stack) - 1
+            _, _, checks, _, less, greater = plan[depth]
+            for t in stack[-1]:
+                t_adj = adj[t]
+                if sum(1 for x in t_adj if x in used) != len(checks):  # only pattern bonds allowed in subgraph
+                    continue
+                if any(t_adj.get(mapping[i]) not in ok for i, ok in checks):
+                    continue
+                if any(t > mapping[i] for i in less) or any(t < mapping[i] for i in greater):
+                    continue
+
+                if depth + 1 == size:
+                    if seen is not None:
+                        atoms = frozenset(chain(mapping, (t,)))
+                        if atoms in seen:  # possible for query patterns
+                            continue
+                        seen.add(atoms)
+                    yield {x: plan[i][0] for i, x in enumerate(chain(mapping, (t,)))}
+                    continue
+
+                mapping.append(t)
+                used.add(t)
+                stack.append(self.__candidates(plan[depth + 1], mapping, used))
+                break
+            else:
+                stack.pop()
+                if mapping:
+                    used.discard(mapping.pop())
+
+    def __candidates(self, step, mapping, used):
+        _, parent, _, candidates, _, _ = step
+        if parent is None:
+            return (x for x in candidates if x not in used)
+        return (x for x in self.__g_adj[mapping[parent]] if x not in used and x in candidates)
+
+    def __get_plan(self):
+        if not self.__compiled:
+            self.__plan = self.__compile()
+            self.__compiled = True
+        return self.__plan
+
+    def __compile(self):
+        g, h, eq = self.__g, self.__h, self.__eq
+        if not h:
+            return []
+        if len(h) > len(g):
+            return None
+
+        g_atoms, g_atoms_values = _classes(g.nodes(data=True), self.__node_marks)
+        h_atoms, h_atoms_values = _classes(h.nodes(data=True), self.__node_marks)
+        g_bonds, g_bonds_values = _classes((((n, m), a) for n, m, a in g.edges(data=True)), self.__edge_marks)
+        h_bonds, h_bonds_values = _classes((((n, m), a) for n, m, a in h.edges(data=True)), self.__edge_marks)
+
+        atoms_ok = [{i for i, x in enumerate(g_atoms_values) if all(eq(a, b) for a, b in zip(x, y))}
+                    for y in h_atoms_values]
+        bonds_ok = [frozenset(i for i, x in enumerate(g_bonds_values) if all(eq(a, b) for a, b in zip(x, y)))
+                    for y in h_bonds_values]
+
+        self.__g_adj = g_adj = {n: {} for n in g}
+        for (n, m), c in g_bonds.items():
+            g_adj[n][m] = g_adj[m][n] = c
+        h_adj = {n: {} for n in h}
+        for (n, m), c in h_bonds.items():
+            h_adj[n][m] = h_adj[m][n] = bonds_ok[c]
+
+        candidates = {}
+        for n, c in h_atoms.items():
+            ok = atoms_ok[c]
+            degree = len(h_adj[n])
+            tmp = candidates[n] = {x for x, y in g_atoms.items() if y in ok and len(g_adj[x]) >= degree}
+            if not tmp:
+                return None
+
+        # ordering: connected to matched atoms, rare, highly connected atoms first
+        order = {}  # atom: position
+        sequence = []
+        while len(sequence) < len(h):
+            connections = {}
+            for n in sequence:
+                for m in h_adj[n]:
+                    if m not in order:
+                        connections[m] = connections.get(m, 0) + 1
+            if connections:
+                n = max(connections, key=lambda x: (connections[x], -len(candidates[x]), len(h_adj[x]), -x))
+            else:  # new component
+                n = min((x for x in h if x not in order), key=lambda x: (len(candidates[x]), -len(h_adj[x]), x))
+            order[n] = len(sequence)
+            sequence.append(n)
+
+        less, greater = _symmetry_steps(h, order, self.__node_marks, self.__edge_marks, self.__automorphic)
+        plan = []
+        for i, n in enumerate(sequence):
+            checks = tuple(sorted(((order[m], ok) for m, ok in h_adj[n].items() if order[m] < i), key=itemgetter(0)))
+            if checks:  # candidates are neighbors of matched atom
+                plan.append((n, checks[0][0], checks, candidates[n], less[i], greater[i]))
+            else:
+                plan.append((n, None, checks, sorted(candidates[n]), less[i], greater[i]))
+        return plan
+
+
+def symmetry_conditions(h, node_marks, edge_marks):
+    """
+    symmetry breaking conditions of pattern. only one of mappings equal up to pattern automorphism satisfy conditions.
+    automorphisms keep atoms and bonds marks equal.
+
+    :param h: (CGR|Molecule)Container. pattern
+    :param node_marks: compared atoms attributes
+    :param edge_marks: compared bonds attributes
+    :return: list of (n, m) pairs of pattern atoms. structure atom of n should be less than structure atom of m
+    """
+    group = list(SubgraphMatcher(h, h, node_marks, edge_marks, query=False).subgraph_isomorphisms_iter())
+    conditions = []
+    while len(group) > 1:
+        orbits = {n: {x[n] for x in group} for n in h}
+        n = max(orbits, key=lambda x: (len(orbits[x]), -x))
+        conditions.extend((n, m) for m in sorted(orbits[n]) if m != n)
+        group = [x for x in group if x[n] == n]
+    return conditions
+
+
+def _symmetry_steps(h, order, node_marks, edge_marks, automorphic):
+    """
+    symmetry breaking conditions checked on matching steps
+    """
+    less = [() for _ in order]
+    greater = [() for _ in order]
+    if not automorphic:
+        for n, m in symmetry_conditions(h, node_marks, edge_marks):
+            n, m = order[n], order[m]
+            if n < m:
+                greater[m] += (n,)
+            else:
+                less[n] += (m,)
+    return less, greater
+
+
+def _classes(items, marks):
+    """
+    compile attributes of atoms or bonds into integer classes
+
+    :param items: pairs of atom or bond and attributes dict
+    :return: dict of item: class and list of attributes of classes
+    """
+    index = {}
+    values = []
+    out = {}
+    for x, attr in items:
+        v = tuple(attr.get(m) for m in marks)
+        k = tuple(_hashable(y) for y in v)
+        c = index.get(k)
+        if c is None:
+            c = index[k] = len(values)
+            values.append(v)
+        out[x] = c
+    return out, values
+
+
+def _hashable(x):
+    if isinstance(x, list):
+        return tuple(_hashable(y) for y in x)
+    if isinstance(x, dict):
+        return tuple((y, _hashable(z)) for y, z in x.items())
+    return x
+
+
+def _list_eq(a, b):
+    return True if b is None else a in b if isinstance(b, list) else a == b
+
+
+def _eq(a, b):
+    return a == b
+
+
+class MultiSubgraphMatcher:
+    """
+    matcher of many patterns in single traversal of structure.
+    patterns are compiled into trie of matching steps. common steps prefixes of patterns are checked only once.
+    """
+    def __init__(self, patterns, node_marks, edge_marks, query=True, automorphic=True):
+        """
+        :param patterns: list of (CGR|Molecule)Containers
+        :param node_marks: compared atoms attributes
+        :param edge_marks: compared bonds attributes
+        :param query: see SubgraphMatcher
+        :param automorphic: see SubgraphMatcher
+        """
+        self.__node_marks = node_marks = tuple(node_marks)
+        self.__edge_marks = edge_marks = tuple(edge_marks)
+        self.__eq = _list_eq if query else _eq
+        self.__automorphic = automorphic
+        self.__atoms = {}
+        self.__bonds = {}
+        self.__root = root = _TrieNode()
+
+        for i, h in enumerate(patterns):
+            order, steps = self.__compile(h, node_marks, edge_marks)
+            node = root
+            node.patterns.add(i)
+            for step in steps:
+                node = node.children.get(step) or node.children.setdefault(step, _TrieNode())
+                node.patterns.add(i)
+            node.ends.append((i, order))
+        # branches of first step in order of patterns. see subgraph_isomorphisms_iter
+        self.__branches = sorted(root.children.items(), key=lambda x: min(x[1].patterns))
+
+    def subgraph_isomorphisms(self, g, subset=None):
+        """
+        find all patterns in structure
+
+        :param g: (CGR|Molecule)Container. structure
+        :param subset: set of patterns indices for search. if None all patterns searched
+        :return: dict of pattern index: list of dicts of structure atom: pattern atom. see SubgraphMatcher
+        """
+        hits = {}
+        for i, mapping in self.__search(g, subset):
+            if mapping is not None:
+                hits.setdefault(i, []).append(mapping)
+        return hits
+
+    def subgraph_isomorphisms_iter(self, g, subset=None):
+        """
+        lazy search of patterns in structure. mappings are generated in order of patterns indices.
+        mappings of pattern are generated after search in all branches of trie containing lower indices patterns.
+        structure is preprocessed on first step. changes of structure after it are not visible to search
+
+        :param g: (CGR|Molecule)Container. structure
+        :param subset: set of patterns indices for search. if None all patterns searched
+        :return: generator of pattern index and dict of structure atom: pattern atom pairs
+        """
+        hits = defaultdict(list)
+        for i, mapping in self.__search(g, subset):
+            if mapping is not None:
+                hits[i].append(mapping)
+            elif hits:  # patterns with lower indices found
+                for j in sorted(x for x in hits if i is None or x < i):
+                    for mapping in hits.pop(j):
+                        yield j, mapping
+
+    def __search(self, g, subset):
+        """
+        single traversal of structure for all patterns
+
+        :return: generator of pattern index and mapping pairs. pairs of lowest pattern index of next trie branch and
+            None are placed between branches. last pair is (None, None)
+        """
+        eq = self.__eq
+        g_atoms, g_atoms_values = _classes(g.nodes(data=True), self.__node_marks)
+        g_bonds, g_bonds_values = _classes((((n, m), a) for n, m, a in g.edges(data=True)), self.__edge_marks)
+        g_adj = {n: {} for n in g}
+        for (n, m), c in g_bonds.items():
+            g_adj[n][m] = g_adj[m][n] = c
+
+        atoms_ok = {}
+        bonds_ok = {}
+
+        def atom_candidates(key):
+            out = atoms_ok.get(key)
+            if out is None:
+                values, degree = self.__atoms[key], key[1]
+                ok = {i for i, x in enumerate(g_atoms_values) if all(eq(a, b) for a, b in zip(x, values))}
+                out = atoms_ok[key] = {x for x, y in g_atoms.items() if y in ok and len(g_adj[x]) >= degree}
+            return out
+
+        def bond_classes(key):
+            out = bonds_ok.get(key)
+            if out is None:
+                values = self.__bonds[key]
+                out = bonds_ok[key] = {i for i, x in enumerate(g_bonds_values)
+                                       if all(eq(a, b) for a, b in zip(x, values))}
+            return out
+
+        mapping = []
+        used = set()
+        seen = None if self.__automorphic else defaultdict(set)
+
+        def ends(node):
+            for i, order in node.ends:
+                if subset is None or i in subset:
+                    if seen is not None:
+                        atoms = frozenset(mapping)
+                        if atoms in seen[i]:  # possible for query patterns
+                            continue
+                        seen[i].add(atoms)
+                    yield i, {x: order[j] for j, x in enumerate(mapping)}
+
+        def branch(step, child):
+            atom, parent, checks, less, greater = step
+            candidates = atom_candidates(atom)
+            if not candidates:
+                return
+            checks = [(j, bond_classes(b)) for j, b in checks]
+            for t in (sorted(candidates) if parent is None else g_adj[mapping[parent]]):
+                if t in used or t not in candidates:
+                    continue
+                t_adj = g_adj[t]
+                if sum(1 for x in t_adj if x in used) != len(checks):
+                    continue
+                if any(t_adj.get(mapping[j]) not in ok for j, ok in checks):
+                    continue
+                if any(t > mapping[j] for j in less) or any(t < mapping[j] for j in greater):
+                    continue
+                mapping.append(t)
+                used.add(t)
+                yield from ends(child)
+                for x in child.children.items():
+                    if subset is None or not x[1].patterns.isdisjoint(subset):
+                        yield from branch(*x)
+                mapping.pop()
+                used.discard(t)
+
+        yield from ends(self.__root)
+        for step, child in self.__branches:
+            if subset is None or not child.patterns.isdisjoint(subset):
+                yield min(child.patterns), None
+                yield from branch(step, child)
+        yield None, None
+
+    def __compile(self, h, node_marks, edge_marks):
+        """
+        matching steps of pattern independent from structure. equal atoms and bonds of patterns have equal keys
+        """
+        atoms = {}
+        for n, attr in h.nodes(data=True):
+            values = tuple(attr.get(m) for m in node_marks)
+            key = (tuple(_hashable(x) for x in values), len(h[n]))
+            self.__atoms.setdefault(key, values)
+            atoms[n] = key
+        bonds = {}
+        for n, m, attr in h.edges(data=True):
+            values = tuple(attr.get(x) for x in edge_marks)
+            key = tuple(_hashable(x) for x in values)
+            self.__bonds.setdefault(key, values)
+            bonds[n, m] = bonds[m, n] = key
+
+        # ordering: connected to matched, specific, highly connected atoms first
+        rank = {n: (sum(x is None or isinstance(x, tuple) for x in k[0]), -k[1], repr(k), n) for n, k in atoms.items()}
+
+        order = {}  # atom: position
+        sequence = []
+        while len(sequence) < len(h):
+            connections = {}
+            for n in sequence:
+                for m in h[n]:
+                    if m not in order:
+                        connections[m] = connections.get(m, 0) + 1
+            if connections:
+                n = min(connections, key=lambda x: (-connections[x],) + rank[x])
+            else:
+                n = min((x for x in h if x not in order), key=rank.get)
+            order[n] = len(sequence)
+            sequence.append(n)
+
+        less, greater = _symmetry_steps(h, order, node_marks, edge_marks, self.__automorphic)
+        steps = []
+        for i, n in enumerate(sequence):
+            checks = tuple(sorted((order[m], bonds[n, m]) for m in h[n] if order[m] < i))
+            steps.append((atoms[n], checks[0][0] if checks else None, checks, less[i], greater[i]))
+        return sequence, steps
+
+
+class _TrieNode:
+    __slots__ = ('children', 'ends', 'patterns')
+
+    def __init__(self):
+        self.children = {}
+        self.ends = []
+        self.patterns = set()
@@ -18,16 +18,18 @@
 #  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #  MA 02110-1301, USA.
 #
-from collections import Counter
-from functools import reduce
-from itertools import count
+from collections import Counter, defaultdict
+from functools import reduce, lru_cache
+from importlib.util import find_spec
+from itertools import count, repeat, accumulate, chain
 from operator import mul, itemgetter
 from sys import stderr
 from ..exceptions import InvalidConfig
 from ..periodictable import elements
 
 
-def get_morgan(g, isotope=False, element=True, stereo=False, hybridization=False, neighbors=False, labels=('s', 'p')):
+def get_morgan(g, isotope=False, element=True, stereo=False, hybridization=False, neighbors=False, labels=('s', 'p'),
+               engine='primes'):
     """
     Morgan like algorithm for graph nodes ordering
 
@@ -48,8 +50,104 @@ def get_morgan(g, isotope=False, element=True, stereo=False, hybridization=False
                        ordering is default for given CGR
                    labels = ('p', 's') or 'ps':
                        ordering equal to reversed CGR. CGR of back reaction.
+    :param engine: 'primes' - classic algorithm with primes products. default. if number of atoms classes exceeds
+                   primes table, hashes engine used.
+                   'hashes' - colors refinement with 64bit hashes of neighbors colors. numbering independent and
+                   scalable to big graphs. if NumPy installed, graphs with more than 200 atoms refined in arrays.
+                   'canonical' - hashes engine refinement with individualization of atoms in symmetric classes and
+                   automorphisms pruning. all atoms get different weights independent from atoms numbering.
+                   signatures of isomorphic structures are always equal.
+
+                   orderings of engines are different. signatures calculated with different engines can't be compared
     :return: dict of atom: weights
     """
+    return get_morgans(g, [(isotope, element, stereo, hybridization, neighbors)], labels, engine)[0]
+
+
+def get_morgans(g, variants, labels=('s', 'p'), engine='primes'):
+    """
+    Morgan like algorithm for several variants of graph nodes ordering in single pass.
+    adjacency scaffold and bonds weights are shared between variants.
+    variants with equal initial atoms classes are refined only once.
+
+    :param g: (CGR|Molecule)Container
+    :param variants: list of (isotope, element, stereo, hybridization, neighbors) tuples. see get_morgan
+    :param labels: see get_morgan
+    :param engine: see get_morgan
+    :return: list of dicts of atom: weights in order of variants. equal orderings share same dict
+    """
+    if engine not in ('primes', 'hashes', 'canonical'):
+        raise InvalidConfig('invalid morgan engine')
+    out = []
+    refined = {}
+    for scaf, params, bonds in _initial_params(g, variants, labels, engine == 'canonical'):
+        if engine == 'primes':
+            try:
+                newlevels = {}
+                countprime = iter(primes)
+                weights = {x: newlevels.get(y) or newlevels.setdefault(y, next(countprime))
+                           for x, y in sorted(params.items(), key=itemgetter(1))}
+
+                k = tuple(weights[n] for n in scaf)
+                if k not in refined:
+                    refined[k] = _refine(scaf, weights)
+                out.append(refined[k])
+                continue
+            except StopIteration:  # primes table exhausted. too many atoms classes. use hashes engine
+                pass
+
+        colors = {n: _fold(x) for n, x in params.items()}
+        if engine == 'canonical':
+            k = ('canonical',) + tuple(colors[n] for n in scaf) + tuple(bonds)
+            if k not in refined:
+                refined[k] = _canonical(scaf, colors, params, bonds)
+        else:
+            k = ('hashes',) + tuple(colors[n] for n in scaf)
+            if k not in refined:
+                refined[k] = _refine_hashes(scaf, colors)
+        out.append(refined[k])
+    return out
+
+
+def get_morgan_batch(graphs, isotope=False, element=True, stereo=False, hybridization=False, neighbors=False,
+                     labels=('s', 'p')):
+    """
+    Morgan like ordering of many graphs in single pass with hashes engine. see get_morgan.
+    if NumPy installed all graphs are refined together in arrays.
+    results are equal to get_morgan results of every graph with hashes engine.
+
+    :param graphs: list of (CGR|Molecule)Containers
+    :return: list of dicts of atom: weights in order of graphs
+    """
+    variant = [(isotope, element, stereo, hybridization, neighbors)]
+    if _np is None:
+        return [_refine_hashes(scaf, {n: _fold(x) for n, x in params.items()})
+                for scaf, params, _ in (next(_initial_params(g, variant, labels)) for g in graphs)]
+
+    nodes, colors, indices, indptr, idx = [], [], [], [0], []
+    for i, g in enumerate(graphs):
+        scaf, params, _ = next(_initial_params(g, variant, labels))
+        index = {n: j for j, n in enumerate(scaf, len(colors))}
+        for n, m in scaf.items():
+            colors.append(_fold(params[n]))
+            indices.extend(index[x] for x in m)
+            indptr.append(len(indices))
+        nodes.append(list(scaf))
+        idx.extend(repeat(i, len(scaf)))
+
+    if not colors:
+        return [{} for _ in graphs]
+    ranks = _refine_array(_np.array(colors, dtype=_np.uint64), _np.array(indptr), _np.array(indices, dtype=int),
+                          _np.array(idx), len(nodes)).tolist()
+    out = []
+    start = 0
+    for x in nodes:
+        out.append(dict(zip(x, ranks[start:start + len(x)])))
+        start += len(x)
+    return out
+
+
+def _initial_params(g, variants, labels, edges=False):
     if labels is None:
         s_charge = 's_charge'
         p_charge = 'p_charge'
@@ -91,32 +189,43 @@ def get_morgan(g, isotope=False, element=True, stereo=False, hybridization=False
         s_neighbors = '%s_neighbors' % s
         p_charge = p_radical = p_stereo = p_bond = p_hyb = p_neighbors = None
 
-    params = {n: (elements.index(attr['element']) if element else 1,
-                  attr.get('isotope', 1) if isotope else 1,
-                  10 * attr[s_charge] + attr.get(p_charge, 0) if element else 1,
-                  10 * (attr.get(s_radical) or 0) + (attr.get(p_radical) or 0) if element else 1,
-                  10 * (attr.get(s_stereo) or 0) + (attr.get(p_stereo) or 0) if stereo else 1,
-                  10 * (attr.get(s_hyb) or 0) + (attr.get(p_hyb) or 0) if hybridization else 1,
-                  10 * (attr.get(s_neighbors) or 0) + (attr.get(p_neighbors) or 0) if neighbors else 1,
-                  reduce(mul, (primes[10 * (eattr.get(s_bond) or 0) + (eattr.get(p_bond) or 0)]
-                               for eattr in g[n].values() if p_bond or eattr.get(s_bond)), 1),
-                  reduce(mul, (primes[10 * (eattr.get(s_stereo) or 0) + (eattr.get(p_stereo) or 0)]
-                               for eattr in g[n].values() if p_bond or eattr.get(s_bond)), 1) if stereo else 1)
-              for n, attr in g.nodes(data=True)}
-
-    newlevels = {}
-    countprime = iter(primes)
-    weights = {x: newlevels.get(y) or newlevels.setdefault(y, next(countprime))
-               for x, y in sorted(params.items(), key=itemgetter(1))}
-
-    numb = len(set(weights.values()))
-    stab = 0
-
     scaf = {}
     for n, m in g.adjacency():
         scaf[n] = tuple(i for i, j in m.items() if p_bond or j.get(s_bond))
 
-    tries = len(g) * 4  # limit for searching
+    bonds = {n: reduce(mul, (primes[10 * (eattr.get(s_bond) or 0) + (eattr.get(p_bond) or 0)]
+                             for eattr in g[n].values() if p_bond or eattr.get(s_bond)), 1) for n in scaf}
+    stereo_bonds = None
+
+    for isotope, element, stereo, hybridization, neighbors in variants:
+        if stereo and stereo_bonds is None:
+            stereo_bonds = {n: reduce(mul, (primes[10 * (eattr.get(s_stereo) or 0) + (eattr.get(p_stereo) or 0)]
+                                            for eattr in g[n].values() if p_bond or eattr.get(s_bond)), 1)
+                            for n in scaf}
+
+        if edges:
+            bonds_codes = tuple((n, m, 10 * (attr.get(s_bond) or 0) + (attr.get(p_bond) or 0),
+                                 10 * (attr.get(s_stereo) or 0) + (attr.get(p_stereo) or 0) if stereo else 0)
+                                for n, m, attr in g.edges(data=True) if p_bond or attr.get(s_bond))
+        else:
+            bonds_codes = None
+
+        yield scaf, {n: (elements.index(attr['element']) if element else 1,
+                         attr.get('isotope', 1) if isotope else 1,
+                         10 * attr[s_charge] + attr.get(p_charge, 0) if element else 1,
+                         10 * (attr.get(s_radical) or 0) + (attr.get(p_radical) or 0) if element else 1,
+                         10 * (attr.get(s_stereo) or 0) + (attr.get(p_stereo) or 0) if stereo else 1,
+                         10 * (attr.get(s_hyb) or 0) + (attr.get(p_hyb) or 0) if hybridization else 1,
+                         10 * (attr.get(s_neighbors) or 0) + (attr.get(p_neighbors) or 0) if neighbors else 1,
+                         bonds[n], stereo_bonds[n] if stereo else 1)
+                     for n, attr in g.nodes(data=True)}, bonds_codes
+
+
+def _refine(scaf, weights):
+    numb = len(set(weights.values()))
+    stab = 0
+
+    tries = len(scaf) * 4  # limit for searching
     while tries:
         oldnumb = numb
         neweights = {}
@@ -151,6 +260,162 @@ def get_morgan(g, isotope=False, element=True, stereo=False, hybridization=False
     return weights
 
 
+def _refine_hashes(scaf, colors):
+    """
+    colors refinement. new color of atom is hash of own color and sum of hashes of neighbors colors.
+    refinement stops then number of classes stops growing.
+    """
+    if _np is not None and len(scaf) > 200:
+        index = {n: i for i, n in enumerate(scaf)}
+        indices = [index[x] for m in scaf.values() for x in m]
+        indptr = list(accumulate(chain((0,), (len(m) for m in scaf.values()))))
+        ranks = _refine_array(_np.array([colors[n] for n in scaf], dtype=_np.uint64), _np.array(indptr),
+                              _np.array(indices, dtype=int), _np.zeros(len(scaf), dtype=int), 1).tolist()
+        return dict(zip(scaf, ranks))
+
+    colors = _refine_colors(scaf, colors)
+    ranks = {c: i for i, c in enumerate(sorted(set(colors.values())), start=1)}
+    return {n: ranks[c] for n, c in colors.items()}
+
+
+def _refine_colors(scaf, colors):
+    numb = len(set(colors.values()))
+    while True:
+        mixed = {n: _mix(c) for n, c in colors.items()}
+        new = {n: _mix(c ^ _mix(sum(mixed[x] for x in scaf[n]) & _mask)) for n, c in colors.items()}
+        newnumb = len(set(new.values()))
+        if newnumb <= numb:
+            return colors
+        colors, numb = new, newnumb
+
+
+def _canonical(scaf, colors, params, bonds):
+    """
+    canonical ordering by individualization-refinement search.
+    leaves of search tree are discrete orderings. ordering with maximal certificate is canonical.
+    leaves with equal certificates give automorphisms used for pruning of equivalent branches.
+    """
+    leaves = {}
+    automorphisms = []
+    best = []
+
+    def search(colors, path):
+        cells = defaultdict(list)
+        for n, c in colors.items():
+            cells[c].append(n)
+        target = min(((len(x), c) for c, x in cells.items() if len(x) > 1), default=None)
+        if target is None:
+            ranks = {n: i for i, (_, n) in enumerate(sorted((c, n) for n, c in colors.items()), start=1)}
+            certificate = (tuple(params[n] for _, n in sorted((r, n) for n, r in ranks.items())),
+                           tuple(sorted((max(ranks[n], ranks[m]), min(ranks[n], ranks[m]), b, st)
+                                        for n, m, b, st in bonds)))
+            if certificate in leaves:
+                other = {r: n for n, r in leaves[certificate].items()}
+                automorphisms.append({n: other[r] for n, r in ranks.items()})
+            else:
+                leaves[certificate] = ranks
+                if not best or certificate > best[0]:
+                    best[:] = certificate, ranks
+            return
+
+        explored = []
+        for n in cells[target[1]]:
+            if explored:
+                stabilizer = [x for x in automorphisms if all(x[p] == p for p in path)]
+                if stabilizer and not _orbit(stabilizer, n).isdisjoint(explored):
+                    continue
+            explored.append(n)
+            individual = colors.copy()
+            individual[n] = _mix(colors[n] ^ _individual)
+            search(_refine_colors(scaf, individual), path + [n])
+
+    search(_refine_colors(scaf, colors), [])
+    return best[1]
+
+
+def _orbit(automorphisms, n):
+    orbit = {n}
+    stack = [n]
+    while stack:
+        x = stack.pop()
+        for a in automorphisms:
+            y = a[x]
+            if y not in orbit:
+                orbit.add(y)
+                stack.append(y)
+    return orbit
+
+
+def _refine_array(colors, indptr, indices, graphs, size):
+    """
+    NumPy implementation of colors refinement of disjoint graphs. equal to _refine_hashes.
+
+    :param colors: uint64 array of initial colors of atoms
+    :param indptr: CSR adjacency pointers
+    :param indices: CSR adjacency indices
+    :param graphs: array of graph index of atoms
+    :param size: number of graphs
+    :return: array of ranks of atoms in their graphs
+    """
+    rows = _np.repeat(_np.arange(len(colors)), _np.diff(indptr))
+    numb = _count_classes(colors, graphs, size)
+    active = _np.ones(size, dtype=bool)
+    while True:
+        mixed = _mix_array(colors)
+        total = _np.zeros(len(colors), dtype=_np.uint64)
+        _np.add.at(total, rows, mixed[indices])
+        new = _mix_array(colors ^ _mix_array(total))
+        newnumb = _count_classes(new, graphs, size)
+        active &= newnumb > numb
+        if not active.any():
+            break
+        colors = _np.where(active[graphs], new, colors)
+        numb = _np.where(active, newnumb, numb)
+
+    order = _np.lexsort((colors, graphs))
+    sc, sg = colors[order], graphs[order]
+    first = _np.ones(len(colors), dtype=bool)
+    first[1:] = (sc[1:] != sc[:-1]) | (sg[1:] != sg[:-1])
+    rank = _np.cumsum(first)
+    start = _np.zeros(len(colors), dtype=bool)
+    start[0] = True
+    start[1:] = sg[1:] != sg[:-1]
+    out = _np.empty(len(colors), dtype=int)
+    out[order] = rank - _np.maximum.accumulate(_np.where(start, rank - 1, 0))
+    return out
+
+
+def _count_classes(colors, graphs, size):
+    order = _np.lexsort((colors, graphs))
+    sc, sg = colors[order], graphs[order]
+    first = _np.ones(len(colors), dtype=bool)
+    first[1:] = (sc[1:] != sc[:-1]) | (sg[1:] != sg[:-1])
+    return _np.bincount(sg[first], minlength=size)
+
+
+def _mix(x):
+    """splitmix64 finalizer"""
+    x = (x + 0x9E3779B97F4A7C15) & _mask
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _mask
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _mask
+    return x ^ (x >> 31)
+
+
+def _mix_array(x):
+    x = x + _np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> _np.uint64(30))) * _np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> _np.uint64(27))) * _np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> _np.uint64(31))
+
+
+@lru_cache(maxsize=4096)
+def _fold(params):
+    h = 0
+    for x in params:
+        h = _mix(h ^ (x & _mask))
+    return h
+
+
 def _eratosthenes():
     """Yields the sequence of prime numbers via the Sieve of Eratosthenes."""
     d = {}  # map each composite integer to its first-found prime factor
@@ -172,3 +437,10 @@ def _eratosthenes():
 
 
 primes = tuple(x for _, x in zip(range(1000), _eratosthenes()))
+_mask = 0xFFFFFFFFFFFFFFFF
+_individual = 0x5851F42D4C957F2D
+
+if find_spec('numpy'):  # arrays backend of hashes engine if available
+    import numpy as _np
+else:
+    _np = None
@@ -19,13 +19,16 @@
 #  MA 02110-1301, USA.
 #
 """ SSSR calculation. based on idea from:
-    Lee, C. J., Kang, Y.-M., Cho, K.-H., & No, K. T. (2009).
-    A robust method for searching the smallest set of smallest rings with a path-included distance matrix.
-    Proceedings of the National Academy of Sciences of the United States of America, 106(41), 17355–17358.
-    http://doi.org/10.1073/pnas.0813040106
+    Horton, J. D. (1987).
+    A polynomial-time algorithm to find the shortest cycle basis of a graph.
+    SIAM Journal on Computing, 16(2), 358–366.
+
+    acyclic parts of graph are ignored. rings are searched in biconnected components only.
+    candidate cycles are built from BFS shortest paths trees and selected by gaussian elimination
+    of bonds incidence vectors.
 """
-from networkx import shortest_simple_paths
-from itertools import combinations
+from collections import deque
+from networkx import biconnected_component_edges
 
 
 def find_sssr(g):
@@ -35,66 +38,85 @@ def find_sssr(g):
     :param g: Molecule Container 
     :return: list of lists of rings nodes or None.
     """
-    n_sssr = g.number_of_edges() - len(g) + 1
-    if not n_sssr:
+    rings = []
+    for edges in biconnected_component_edges(g):
+        if len(edges) > 1:
+            rings.extend(_component_sssr(edges))
+
+    if not rings:
         return None
+    rings.sort(key=len)
+    return rings
 
-    pid1 = {}
-    pid2 = {}
 
-    for ij in combinations(g, 2):
-        for path in shortest_simple_paths(g, *ij):  # slowest part of algorithm
-            if ij not in pid1:
-                pid1[ij] = [path]
-                ls = len(path)
-                continue
+def _component_sssr(edges):
+    adj = {}
+    index = {}
+    for n, (i, j) in enumerate(edges):
+        adj.setdefault(i, []).append(j)
+        adj.setdefault(j, []).append(i)
+        index[(i, j)] = index[(j, i)] = 1 << n
 
-            lp = len(path)
-            if lp == ls:
-                pid1[ij].append(path)
-            elif lp == ls + 1:
-                if ij not in pid2:
-                    pid2[ij] = [path]
-                else:
-                    pid2[ij].append(path)
-            else:
-                break
+    n_sssr = len(edges) - len(adj) + 1
+    if n_sssr == 1:  # simple ring
+        ring = [edges[0][0]]
+        prev, n = None, ring[0]
+        while True:
+            n, prev = adj[n][0] if adj[n][0] != prev else adj[n][1], n
+            if n == ring[0]:
+                return [ring]
+            ring.append(n)
 
-    c_set = []
-    for ij, p1ij in pid1.items():
-        dij = len(p1ij[0]) - 1
-        p2ij = pid2.get(ij)
+    candidates = {}
+    for root in adj:
+        parent = {root: None}
+        branch = {root: root}
+        depth = {root: 0}
+        queue = deque([root])
+        non_tree = []
+        while queue:
+            i = queue.popleft()
+            for j in adj[i]:
+                if j not in parent:
+                    parent[j] = i
+                    branch[j] = j if i == root else branch[i]
+                    depth[j] = depth[i] + 1
+                    queue.append(j)
+                elif i < j and parent[i] != j and parent[j] != i:
+                    non_tree.append((i, j))
 
-        if not p2ij and len(p1ij) == 1:
-            continue
+        for i, j in non_tree:
+            if branch[i] == branch[j] and i != root and j != root:  # paths from root not disjoint
+                continue
+            path_i = _tree_path(parent, i)
+            path_j = _tree_path(parent, j)
+            mask = index[(i, j)]
+            for x, y in zip(path_i, path_i[1:]):
+                mask |= index[(x, y)]
+            for x, y in zip(path_j, path_j[1:]):
+                mask |= index[(x, y)]
+            if mask not in candidates:
+                candidates[mask] = path_i[::-1] + path_j[:-1]
 
-        c_num = 2 * dij
-        if p2ij:
-            c_num += 1
+    rings = []
+    basis = {}
+    for mask, ring in sorted(candidates.items(), key=lambda x: len(x[1])):
+        vector = mask
+        while vector:
+            pivot = vector.bit_length() - 1
+            if pivot not in basis:
+                basis[pivot] = vector
+                rings.append(ring)
+                break
+            vector ^= basis[pivot]
+        if len(rings) == n_sssr:
+            break
+    return rings
 
-        c_set.append((c_num, p1ij, p2ij))
 
-    n_ringidx, c_sssr = 0, {}
-    for c_num, p1ij, p2ij in sorted(c_set):
-        if c_num % 2:
-            c1 = p1ij[0]
-            cs1 = set(c1)
-            for c2 in p2ij:
-                if len(cs1.intersection(c2)) == 2:
-                    c = c1 + c2[-2:0:-1]
-                    ck = tuple(sorted(c))
-                    if ck not in c_sssr:
-                        c_sssr[ck] = c
-                        n_ringidx += 1
-                    if n_ringidx == n_sssr:
-                        return list(c_sssr.values())
-        else:
-            for c1, c2 in zip(p1ij, p1ij[1:]):
-                if len(set(c1).intersection(c2)) == 2:
-                    c = c1 + c2[-2:0:-1]
-                    ck = tuple(sorted(c))
-                    if ck not in c_sssr:
-                        c_sssr[ck] = c
-                        n_ringidx += 1
-                    if n_ringidx == n_sssr:
-                        return list(c_sssr.values())
+def _tree_path(parent, n):
+    path = [n]
+    while parent[n] is not None:
+        n = parent[n]
+        path.append(n)
+    return path
@@ -33,3 +33,27 @@ def pyramid_volume(n, u, v, w):
 if find_spec('numba'):  # jitting if available
     from numba import njit
     pyramid_volume = njit(pyramid_volume)
+
+
+def pyramid_volumes(pyramids):
+    """
+    signed volumes of many pyramids in single call. NumPy vectorized if available
+
+    :param pyramids: list of (n, u, v, w) tuples of xyz coordinates. see pyramid_volume
+    :return: list of volumes
+    """
+    if not pyramids:
+        return []
+    if _np is None:
+        return [pyramid_volume(*x) for x in pyramids]
+
+    p = _np.array(pyramids, dtype=float)
+    u, v, w = p[:, 1] - p[:, 0], p[:, 2] - p[:, 0], p[:, 3] - p[:, 0]
+    return (u[:, 0] * (v[:, 1] * w[:, 2] - v[:, 2] * w[:, 1]) + u[:, 1] * (v[:, 2] * w[:, 0] - v[:, 0] * w[:, 2]) +
+            u[:, 2] * (v[:, 0] * w[:, 1] - v[:, 1] * w[:, 0])).tolist()
+
+
+if find_spec('numpy'):
+    import numpy as _np
+else:
+    _np = None
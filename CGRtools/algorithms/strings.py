@@ -18,19 +18,36 @@
 #  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #  MA 02110-1301, USA.
 #
-from hashlib import md5, sha256
-from itertools import chain, count
+from hashlib import md5, sha256, blake2b
+from collections import defaultdict
+from itertools import count
 from warnings import warn
+from ..exceptions import InvalidConfig
 
 
-def hash_cgr_string(string):
+def hash_cgr_string(string, algorithm=None):
     """
-    concatenated md5 and sha256 hashes of cgr string 
-    :param string: 
-    :return: 48 bytes length string  
+    hash of cgr string
+
+    :param string: cgr string
+    :param algorithm: 'md5sha256' or None - concatenated md5 and sha256 hashes. 48 bytes length string.
+                      'blake64' or 'blake128' - fast keyed BLAKE2 hash. integer of 64 or 128 bits.
+                      useful for in-memory deduplication and dict keys.
     """
-    bs = string.encode()
-    return md5(bs).digest() + sha256(bs).digest()
+    try:
+        return _hash_algorithms[algorithm or 'md5sha256'](string.encode())
+    except KeyError:
+        raise InvalidConfig('invalid hash algorithm')
+
+
+def _blake(size):
+    def h(bs):
+        return int.from_bytes(blake2b(bs, digest_size=size, key=b'CGRtools').digest(), 'big')
+    return h
+
+
+_hash_algorithms = {'md5sha256': lambda bs: md5(bs).digest() + sha256(bs).digest(),
+                    'blake64': _blake(8), 'blake128': _blake(16)}
 
 
 class CGRstring:
@@ -40,49 +57,79 @@ class CGRstring:
         self.__hyb = hybridization
         self.__neighbors = neighbors
         self.__element = element
-        self.__get_smi = self.__cgr_smi if is_cgr else self.__mol_smi
         self.__is_cgr = is_cgr
 
-    def __call__(self, g, weights):
+    def __call__(self, g, weights, trace=None):
+        """
+        :param g: Molecule or CGR Container
+        :param weights: dict of atoms in keys and orders in values
+        :param trace: precalculated traversal of graph. see traverse method
+        """
+        if trace is None:
+            trace = self.traverse(g, weights)
+
+        jssmiles = '.'.join(self.__render(g, x, 's') for x in trace)
+        if self.__is_cgr:
+            jpsmiles = '.'.join(self.__render(g, x, 'p') for x in trace)
+            return '%s>>%s' % (jssmiles, jpsmiles) if jssmiles != jpsmiles else jssmiles
+
+        return jssmiles
+
+    def traverse(self, g, weights):
+        """
+        depth first search of graph in order of weights. independent from string options.
+        traversal can be shared between strings of same weights with different options.
+
+        :return: list of tokens lists of connected components. tokens are atoms numbers,
+                 (atom, atom, cycle number or None) tuples for bonds and strings for branches
+        """
         self.__weights = weights
         self.__visited = visited = set()
-        self.__countmap, self.__countcyc = count(1), count(1)
+        self.__countcyc = count(1)
         self.__g = g
 
-        has_next = g
-        ssmiles, psmiles = [], []
+        has_next = set(g)
+        trace = []
         while has_next:
             firstatom = self.__get_next_atom(has_next)
-            smirks = self.__do_cgr_smarts({firstatom}, firstatom, firstatom)
-            ssmiles.append(''.join(smirks[1]))
-            if self.__is_cgr:
-                psmiles.append(''.join(smirks[2]))
-            has_next = set(g).difference(visited)
+            trace.append(self.__flatten(self.__do_cgr_smarts(firstatom)))
+            has_next.difference_update(visited)
 
-        jssmiles = '.'.join(ssmiles)
-        if self.__is_cgr:
-            jpsmiles = '.'.join(psmiles)
-            return '%s>>%s' % (jssmiles, jpsmiles) if jssmiles != jpsmiles else jssmiles
+        del self.__g, self.__weights, self.__visited
+        return trace
 
-        return jssmiles
+    def __render(self, g, tokens, side):
+        stereo = self.__stereo
+        bond_key = '%s_bond' % side
+        stereo_key = '%s_stereo' % side
+        get_smi = self.__get_sp_smi
+        to_smiles = self.__to_smiles
+        atom_keys = (stereo_key, '%s_hyb' % side, '%s_neighbors' % side, '%s_charge' % side)
+        nodes = g.nodes
+
+        smi = []
+        for t in tokens:
+            if isinstance(t, str):
+                smi.append(t)
+            elif isinstance(t, tuple):
+                n, m, cyc = t
+                b = g[n][m]
+                smi.append('%s%s%s' % (to_smiles[b.get(bond_key)], stereo and b.get(stereo_key) or '',
+                                       '' if cyc is None else cyc))
+            else:
+                smi.append(get_smi(nodes[t], *atom_keys))
+        return ''.join(smi)
 
     def __get_next_atom(self, atoms):
         if len(atoms) == 1:
-            nextatom = list(atoms)[0]
+            nextatom = next(iter(atoms))
         else:
             weights = self.__weights
-            nextatom = sorted((weights[i], i) for i in atoms)[-1][1]
+            nextatom = max((weights[i], i) for i in atoms)[1]
 
         self.__visited.add(nextatom)
         return nextatom
 
-    def __mol_smi(self, gni):
-        return self.__get_sp_smi(gni, 's_stereo', 's_hyb', 's_neighbors', 's_charge'), None
-
-    def __cgr_smi(self, gni):
-        return self.__get_sp_smi(gni, 's_stereo', 's_hyb', 's_neighbors', 's_charge'), \
-               self.__get_sp_smi(gni, 'p_stereo', 'p_hyb', 'p_neighbors', 'p_charge')
-
     def __get_sp_smi(self, gni, stereo, hyb, neighbors, charge):
         smi = []
         if self.__stereo and gni.get(stereo):
@@ -118,53 +165,72 @@ class CGRstring:
 
         return ''.join(smi)
 
-    def __do_cgr_smarts(self, trace, inter, prev):
+    def __do_cgr_smarts(self, first):
+        """
+        iterative depth first search. branches are stored as nested lists of tokens.
+        cycles closures are collected per atom and written when search returns to it
+        """
         g = self.__g
         countcyc = self.__countcyc
-        to_smiles = self.__to_smiles
-        stereo = self.__stereo
-
-        s_atom, p_atom = self.__get_smi(self.__g.nodes[inter])
-        smis, smip = [s_atom], [p_atom]
-        concat = []
-        stoplist = []
-        iterlist = set(g.neighbors(inter)).difference([prev])
-        while iterlist:
-            i = self.__get_next_atom(iterlist)
-            iterlist.discard(i)
-            gii = g[inter][i]
-            if i in trace:
-                if i not in stoplist:  # костыль для циклов. чтоб не было 2х проходов.
-                    cyc = next(countcyc)
-                    concat.append((i, cyc, inter))
-                    smis.append('%s%s%d' % (to_smiles[gii.get('s_bond')], stereo and gii.get('s_stereo') or '', cyc))
-                    if smip:
-                        smip.append('%s%s%d' % (to_smiles[gii.get('p_bond')],
-                                                stereo and gii.get('p_stereo') or '', cyc))
-                continue
-
-            deep0, deep1, deep2, deep3 = self.__do_cgr_smarts(set(chain(trace, [i])), i, inter)
-            trace.update(deep0)
-            if deep3:
-                for j0, j1, j2 in deep3:
-                    if j0 == inter:
-                        gij = g[inter][j2]
-                        stoplist.append(j2)
-                        smis.append('%s%s%d' % (to_smiles[gij.get('s_bond')],
-                                                stereo and gij.get('s_stereo') or '', j1))
-                        if smip:
-                            smip.append('%s%s%d' % (to_smiles[gij.get('p_bond')],
-                                                    stereo and gij.get('p_stereo') or '', j1))
-                    else:
-                        concat.append((j0, j1, j2))
-            smis.extend(['(' if iterlist else '',
-                         '%s%s' % (to_smiles[gii.get('s_bond')], stereo and gii.get('s_stereo') or '')] + deep1 +
-                        [')' if iterlist else ''])
-            if smip:
-                smip.extend(['(' if iterlist else '',
-                             '%s%s' % (to_smiles[gii.get('p_bond')], stereo and gii.get('p_stereo') or '')] + deep2 +
-                            [')' if iterlist else ''])
-        return trace, smis, smip, concat
+        get_next_atom = self.__get_next_atom
+
+        trace = {first}
+        closures = defaultdict(list)
+        smis = [first]
+        # frame: atom, unvisited neighbors, tokens, stoplist
+        stack = [(first, set(g.neighbors(first)), smis, set())]
+        child = None
+        while stack:
+            inter, iterlist, tokens, stoplist = stack[-1]
+            if child is not None:
+                i, deep = child
+                child = None
+                if inter in closures:
+                    for j1, j2 in closures.pop(inter):
+                        stoplist.add(j2)
+                        tokens.append((inter, j2, j1))
+                if iterlist:
+                    tokens.append('(')
+                    tokens.append((inter, i, None))
+                    tokens.append(deep)
+                    tokens.append(')')
+                else:
+                    tokens.append((inter, i, None))
+                    tokens.append(deep)
+
+            while iterlist:
+                i = get_next_atom(iterlist)
+                iterlist.discard(i)
+                if i in trace:
+                    if i not in stoplist:  # костыль для циклов. чтоб не было 2х проходов.
+                        cyc = next(countcyc)
+                        closures[i].append((cyc, inter))
+                        tokens.append((inter, i, cyc))
+                    continue
+
+                trace.add(i)
+                nbrs = set(g.neighbors(i))
+                nbrs.discard(inter)
+                stack.append((i, nbrs, [i], set()))
+                break
+            else:
+                stack.pop()
+                child = inter, tokens
+        return smis
+
+    @staticmethod
+    def __flatten(tokens):
+        out = []
+        stack = [iter(tokens)]
+        while stack:
+            for t in stack[-1]:
+                if isinstance(t, list):
+                    stack.append(iter(t))
+                    break
+                out.append(t)
+            else:
+                stack.pop()
+        return out
 
     __to_smiles = {1: '-', 2: '=', 3: '#', 4: ':', None: '.', 9: '~'}
     __hyb_types = {4: 'a', 3: 't', 2: 'd', 1: 's', None: ''}
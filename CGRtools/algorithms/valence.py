@@ -18,13 +18,56 @@
 #  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #  MA 02110-1301, USA.
 #
+from collections import namedtuple
 from ..exceptions import ValenceError
 
 
+ValenceReport = namedtuple('ValenceReport', ['atom', 'side', 'element', 'charge', 'radical', 'valence'])
+
+
 class Valence:
     def __init__(self):
-        self.__valence_rules = self.__prepare_valence_rules()
-        self.__implicit_rules = self.__prepare_implicit_h_rules()
+        if self.__valence_rules is None:  # rules shared by all structures
+            Valence.__valence_rules = self.__prepare_valence_rules()
+            Valence.__implicit_rules = self.__prepare_implicit_h_rules()
+            Valence.__valence_sets = {k: frozenset(v) for k, v in self.__valence_rules.items()}
+
+    def _check_valences(self, label='s'):
+        """
+        whole structure valence check. bonds orders sums are calculated in single pass over bonds.
+        atoms with special rules are checked separately with neighbors.
+
+        :param label: side of structure
+        :return: list of ValenceReport namedtuples of invalid atoms
+        """
+        lb = '%s_bond' % label
+        lc = '%s_charge' % label
+        lr = '%s_radical' % label
+        bonds = self.__bonds
+        special = self.__special
+        rules = self.__valence_sets
+
+        sums = dict.fromkeys(self, 0)
+        for n, m, b in self.edges(data=lb):
+            if b:
+                b = bonds[b]
+                sums[n] += b
+                sums[m] += b
+
+        out = []
+        for n, a in self.nodes(data=True):
+            element = a['element']
+            charge = a[lc]
+            radical = self._radical_map[a.get(lr)]
+            valence = int(sums[n])
+            if element in special:
+                tmp = [(y[lb], self.nodes[x]['element']) for x, y in self[n].items() if y.get(lb)]
+                if self._check_valence(element, charge, [x for x, _ in tmp], radical, neighbors=[x for _, x in tmp]):
+                    continue
+            elif valence in rules.get((element, charge, radical), ()):
+                continue
+            out.append(ValenceReport(n, label, element, charge, radical, valence))
+        return out
 
     def _check_charge_radical(self, element, charge, radical=None):
         if radical is None:
@@ -294,3 +337,5 @@ class Valence:
 
     __inorganic_molecules = {'transition': ('Mn,=O,=O,=O,-O', 'Mn,=O,=O')}
     __bonds = {1: 1, 2: 2, 3: 4, 4: 1.5, 9: 1}
+    __special = {'S', 'Se', 'Te', 'Po', 'N', 'Xe', 'Cl', 'Br', 'I', 'At'}  # elements with neighbors dependent rules
+    __valence_rules = __implicit_rules = __valence_sets = None
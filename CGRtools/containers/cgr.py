@@ -22,7 +22,7 @@ from collections import namedtuple
 from itertools import repeat, zip_longest
 from .molecule import MoleculeContainer
 from ..algorithms import CGRstring
-from ..exceptions import InvalidData, InvalidAtom, InvalidStereo
+from ..exceptions import InvalidData, InvalidAtom, InvalidStereo, FrozenStructure
 from ..periodictable import elements
 
 
@@ -43,7 +43,7 @@ class CGRContainer(MoleculeContainer):
     @classmethod
     def unpickle(cls, data):
         """convert json serializable CGR or Molecule into MoleculeContainer or CGRcontainer object instance"""
-        graph, meta = super().unpickle(data)
+        graph, meta = super(MoleculeContainer, cls).unpickle(data)
         g = MoleculeContainer(graph, meta) if data['s_only'] else cls(graph, meta)
         g.fix_data()
         return g
@@ -166,8 +166,14 @@ class CGRContainer(MoleculeContainer):
                 raise InvalidStereo('unsupported stereo or stereo impossible. tetrahedron only supported')
 
     def get_stereo(self, atom1, atom2):
-        # todo: implement
-        return None, None
+        if self.__stereo_cache is None:
+            self.__stereo_cache = self._get_stereo_bonds(labels='s'), self._get_stereo_bonds('p', labels='p')
+        s, p = self.__stereo_cache
+        return s.get((atom1, atom2)), p.get((atom1, atom2))
+
+    def flush_cache(self):
+        super().flush_cache()
+        self.__stereo_cache = None
 
     def get_center_atoms(self, stereo=False):
         """ get list of atoms of reaction center (atoms with dynamic: bonds, stereo, charges, radicals).
@@ -191,6 +197,8 @@ class CGRContainer(MoleculeContainer):
         :param copy: if True return copy of graph and keep existing as is
         :return: graph if copy True else None
         """
+        if not copy and self.is_frozen:
+            raise FrozenStructure('frozen structure can not be modified. use copy')
         g = self.copy() if copy else self
         for i in g:
             label = dict(s_hyb=1, p_hyb=1, sp_hyb=1, s_neighbors=0, p_neighbors=0, sp_neighbors=0)
@@ -227,7 +235,6 @@ class CGRContainer(MoleculeContainer):
         explicit = {}
         hydrogens = set()
         for_remove = []
-        c = 0
         for n, attr in self.nodes(data=True):
             if attr['element'] == 'H':
                 for m in self.neighbors(n):
@@ -252,13 +259,10 @@ class CGRContainer(MoleculeContainer):
                 for x in h:
                     for_remove.append(x)
 
-        for x in for_remove:
-            if x not in hydrogens:
-                self.remove_node(x)
-                c += 1
-
+        for_remove = [x for x in for_remove if x not in hydrogens]
+        self.remove_nodes_from(for_remove)
         self.flush_cache()
-        return c
+        return len(for_remove)
 
     def explicify_hydrogens(self):
         """
@@ -272,13 +276,22 @@ class CGRContainer(MoleculeContainer):
                 si, pi = self.atom_implicit_h(n)
                 if si or pi:
                     for s_mark, p_mark in zip_longest(repeat(1, si), repeat(1, pi)):
-                        tmp.append((n, s_mark, p_mark))
+                        tmp.append((n, self.__h_bonds[(s_mark, p_mark)]))
 
-        for n, s_mark, p_mark in tmp:
-            self.add_bond(n, self.add_atom('H', 0), s_mark, p_mark)
+        return self._add_hydrogens(tmp)
 
-        self.flush_cache()
-        return len(tmp)
+    @staticmethod
+    def _hydrogen_attr(n):
+        return dict(element='H', s_charge=0, p_charge=0, mark='0', s_x=0, s_y=0, s_z=0, p_x=0, p_y=0, p_z=0, map=n)
+
+    def check_valence(self):
+        """
+        check valence of all atoms of reagents and products sides of CGR
+
+        :return: list of ValenceReport(atom, side, element, charge, radical, valence) namedtuples of atoms
+                 with invalid valence. empty list for valid CGR
+        """
+        return self._check_valences() + self._check_valences('p')
 
     def atom_implicit_h(self, atom):
         attr = self.nodes[atom]
@@ -342,4 +355,5 @@ class CGRContainer(MoleculeContainer):
     _atom_container = namedtuple('Atom', __tmp3)
     _bond_container = namedtuple('Bond', _edge_save)
     __implicit_container = namedtuple('ImplicitH', ('s_implicit', 'p_implicit'))
-    __visible = None
+    __h_bonds = {(1, 1): dict(s_bond=1, p_bond=1), (1, None): dict(s_bond=1), (None, 1): dict(p_bond=1)}
+    __visible = __stereo_cache = None
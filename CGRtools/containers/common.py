@@ -19,14 +19,21 @@
 #  MA 02110-1301, USA.
 #
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, Counter, namedtuple
+from heapq import heappop, heappush
 from itertools import chain
 from networkx import Graph, relabel_nodes
+from networkx.classes.coreviews import FilterAtlas, FilterAdjacency
+from networkx.classes.filters import show_nodes, no_filter
 from networkx.readwrite.json_graph import node_link_graph, node_link_data
 from typing import Callable, Iterable
 from warnings import warn
-from ..algorithms import hash_cgr_string, get_morgan
-from ..exceptions import InvalidData, InvalidAtom
+from weakref import ref
+from ..algorithms import hash_cgr_string, get_morgan, get_morgans, find_sssr, get_fingerprint
+from ..exceptions import InvalidData, InvalidAtom, FrozenStructure
+
+
+RingsInfo = namedtuple('RingsInfo', ['rings', 'atoms', 'bonds', 'sizes', 'systems'])
 
 
 class BaseContainer(Graph, ABC):
@@ -49,11 +56,14 @@ class BaseContainer(Graph, ABC):
         if self.__visible is None:
             self.__visible = [self.pickle.__name__, self.unpickle.__name__, self.copy.__name__, self.remap.__name__,
                               self.flush_cache.__name__, self.substructure.__name__,  self.get_morgan.__name__,
-                              self.get_signature.__name__, self.get_signature_hash.__name__, self.fix_data.__name__,
-                              self.get_environment.__name__, self.atom.__name__, self.bond.__name__,
-                              self.add_atom.__name__, self.add_bond.__name__, self.add_stereo.__name__,
-                              self.get_stereo.__name__, self.delete_atom.__name__, self.delete_bond.__name__,
-                              'meta', 'bonds_count', 'atoms_count']  # properties names inaccessible
+                              self.get_signature.__name__, self.get_signature_hash.__name__,
+                              self.get_signatures.__name__, self.get_morgans.__name__, self.fix_data.__name__,
+                              self.get_environment.__name__, self.get_rings.__name__, self.get_fingerprint.__name__,
+                              self.get_free_numbers.__name__,
+                              self.atom.__name__, self.bond.__name__, self.add_atom.__name__, self.add_bond.__name__,
+                              self.add_stereo.__name__, self.get_stereo.__name__, self.delete_atom.__name__,
+                              self.delete_bond.__name__, self.freeze.__name__,
+                              'meta', 'bonds_count', 'atoms_count', 'is_frozen', 'is_view']  # properties names inaccessible
         return self.__visible
 
     def atom(self, n):
@@ -165,7 +175,7 @@ class BaseContainer(Graph, ABC):
         copy.meta.update(self.meta)
         return copy
 
-    def substructure(self, nbunch, meta=False):
+    def substructure(self, nbunch, meta=False, view=False):
         """
         create substructure containing atoms from nbunch list
 
@@ -173,11 +183,118 @@ class BaseContainer(Graph, ABC):
 
         :param nbunch: list of atoms numbers of substructure
         :param meta: if True metadata will be copied to substructure
+        :param view: if True return lightweight substructure which shares atoms and bonds with original structure.
+            atoms and bonds will be copied on first modification by container or graph methods.
+            direct changes of atoms or bonds attributes dictionaries of view will change original structure.
+            caches of view are flushed with caches of original structure. pickled view is plain structure
         :return: Molecule or CGR container
         """
+        if view:
+            node_ok = show_nodes(self.nbunch_iter(nbunch))
+            sub = self.__class__.__new__(self.__class__)
+            sub.graph = self.graph
+            sub._node = FilterAtlas(self._node, node_ok)
+            sub._adj = FilterAdjacency(self._adj, node_ok, no_filter)
+            if meta:
+                sub.__meta = self.meta.copy()
+            for x in self.__view_mutators:
+                setattr(sub, x, sub.__get_view_mutator(x))
+            sub.__is_view = True
+            if self.__views is None:
+                self.__views = []
+            else:
+                self.__views = [x for x in self.__views if x() is not None]
+            self.__views.append(ref(sub))
+            return sub
         return self.__class__(self.subgraph(nbunch), self.meta if meta else None)
 
-    def get_environment(self, atoms, dante=False, deep=0):
+    def get_rings(self, side=None):
+        """
+        rings information. calculated on demand and cached until flush_cache
+
+        :param side: bonds used for rings search. 's' - reagents side bonds of CGR, 'p' - products side bonds of CGR.
+                     None - all bonds. for MoleculeContainer 's' is equal to None
+        :return: RingsInfo namedtuple. rings - tuple of SSSR rings (tuples of atoms in ring order),
+                 atoms - dict of ring atoms with tuples of their rings indexes,
+                 bonds - dict of ring bonds (frozensets of atoms pairs) with tuples of their rings indexes,
+                 sizes - dict of ring atoms with tuples of their rings sizes,
+                 systems - tuple of fused rings systems (tuples of rings indexes of rings with common bonds)
+        """
+        if self.__rings is None:
+            self.__rings = {}
+        if side not in self.__rings:
+            if side is None:
+                g = self
+            elif side in ('s', 'p'):
+                g = self.edge_subgraph((n, m) for n, m, b in self.edges(data='%s_bond' % side) if b)
+            else:
+                raise InvalidData('invalid side')
+
+            rings = tuple(tuple(x) for x in find_sssr(g) or ())
+            atoms = defaultdict(list)
+            bonds = defaultdict(list)
+            for i, r in enumerate(rings):
+                for n, m in zip(r, r[1:] + r[:1]):
+                    atoms[n].append(i)
+                    bonds[frozenset((n, m))].append(i)
+
+            systems = {i: {i} for i in range(len(rings))}
+            for x in bonds.values():
+                system = set().union(*(systems[i] for i in x))
+                for i in system:
+                    systems[i] = system
+
+            self.__rings[side] = RingsInfo(rings, {n: tuple(x) for n, x in atoms.items()},
+                                           {n: tuple(x) for n, x in bonds.items()},
+                                           {n: tuple(len(rings[i]) for i in x) for n, x in atoms.items()},
+                                           tuple(sorted({tuple(sorted(x)) for x in systems.values()})))
+        return self.__rings[side]
+
+    def get_free_numbers(self, count=1):
+        """
+        lowest unused atoms numbers. numbers are not reserved.
+        free numbers are tracked incrementally on atoms removing
+
+        :param count: number of atoms numbers
+        :return: list of numbers in ascending order
+        """
+        if self.__free is None:
+            top = max(self, default=0)
+            self.__free = [sorted(set(range(1, top)).difference(self)), top]
+
+        heap, top = self.__free
+        out = []
+        while heap and len(out) < count:
+            n = heappop(heap)
+            if n not in self and (not out or n != out[-1]):  # skip used and duplicated numbers
+                out.append(n)
+        while len(out) < count:
+            top += 1
+            if top not in self:
+                out.append(top)
+        self.__free[1] = top
+
+        for n in out:  # keep numbers free until atoms added
+            heappush(heap, n)
+        return out
+
+    def remove_node(self, n):
+        super().remove_node(n)
+        if self.__free is not None:
+            heappush(self.__free[0], n)
+
+    def remove_nodes_from(self, nodes):
+        nodes = list(nodes)
+        super().remove_nodes_from(nodes)
+        if self.__free is not None:
+            for n in nodes:
+                heappush(self.__free[0], n)
+
+    def clear(self):
+        super().clear()
+        self.__free = None
+
+    def get_environment(self, atoms, dante=False, deep=0, view=False):
         """
         get subgraph with atoms and their neighbors
 
@@ -185,6 +302,7 @@ class BaseContainer(Graph, ABC):
         :param dante: if True return list of graphs containing atoms, atoms + first circle, atoms + 1st + 2nd,
         etc up to deep or while new nodes available.
         :param deep: number of bonds between atoms and neighbors.
+        :param view: return substructures views. see substructure
         """
         nodes = [set(atoms)]
         for i in range(deep):
@@ -194,23 +312,61 @@ class BaseContainer(Graph, ABC):
             nodes.append(n)
 
         if dante:
-            centers = [self.substructure(a) for a in nodes]
+            centers = [self.substructure(a, view=view) for a in nodes]
         else:
-            centers = self.substructure(nodes[-1])
+            centers = self.substructure(nodes[-1], view=view)
 
         return centers
 
+    @property
+    def is_view(self):
+        return self.__is_view
+
+    def __get_view_mutator(self, name):
+        def mutator(*args, **kwargs):
+            self.__materialize()
+            return getattr(self, name)(*args, **kwargs)
+        return mutator
+
+    def __materialize(self):
+        """
+        replace shared with original structure atoms and bonds by copies
+        """
+        node = {n: attr.copy() for n, attr in self._node.items()}
+        adj = {n: {} for n in node}
+        for n, nbrs in self._adj.items():
+            adj_n = adj[n]
+            for m, attr in nbrs.items():
+                if m not in adj_n:
+                    adj_n[m] = adj[m][n] = attr.copy()
+
+        for x in chain(self.__view_mutators, ('nodes', 'edges', 'adj', 'degree')):  # drop views on shared data
+            self.__dict__.pop(x, None)
+        self._node = node
+        self._adj = adj
+        self.graph = self.graph.copy()
+        self.__is_view = False
+        self.flush_cache()
+
     def remap(self, mapping, copy=False):
+        if not copy and self.__frozen:
+            _frozen_error()
         g = relabel_nodes(self, mapping, copy=copy)
         if copy:
             g.meta.update(self.meta)
         return g
 
-    def get_signature_hash(self, *args, **kwargs):
-        return hash_cgr_string(self.get_signature(*args, **kwargs))
+    def get_signature_hash(self, *args, algorithm=None, **kwargs):
+        """
+        get hash of signature string. see get_signature
+
+        :param algorithm: hash algorithm. see hash_cgr_string
+        :return: bytes or int
+        """
+        return hash_cgr_string(self.get_signature(*args, **kwargs), algorithm)
 
     def get_signature(self, isotope=False, stereo=False, hybridization=False, neighbors=False, element=True,
-                      flush_cache=False,  weights=None, hyb=False):
+                      flush_cache=False,  weights=None, hyb=False, engine='primes'):
         """
         return string representation of structure
 
@@ -222,30 +378,92 @@ class BaseContainer(Graph, ABC):
         :param element: set elements marks
         :param flush_cache: recalculate signature if True
         :param hyb: deprecated. see hybridization arg
+        :param engine: morgan algorithm engine. see algorithms.morgan.get_morgan
         """
         if hyb:
             warn('attr hyb is deprecated, use hybridization instead', DeprecationWarning)
             hybridization = hyb
 
-        if flush_cache or self.__signatures is None:
+        if flush_cache and not self.__frozen or self.__signatures is None:
             self.__signatures = {}
 
-        k = (isotope, element, stereo, hybridization, neighbors)
+        k = (isotope, element, stereo, hybridization, neighbors, engine)
         out = self.__signatures.get(k)
         if not out:
             sg = self._signature_generator(element, isotope, stereo, hybridization, neighbors)
             if not weights:
-                weights = self.get_morgan(isotope, element, stereo, hybridization, neighbors, flush_cache=flush_cache)
+                weights = self.get_morgan(isotope, element, stereo, hybridization, neighbors, flush_cache=flush_cache,
+                                          engine=engine)
             self.__signatures[k] = out = sg(self, weights)
         return out
 
     def get_morgan(self, isotope=False, element=True, stereo=False, hybridization=False, neighbors=False, labels=None,
-                   flush_cache=False):
-        if flush_cache or self.__weights is None:
+                   flush_cache=False, engine='primes'):
+        if flush_cache and not self.__frozen or self.__weights is None:
             self.__weights = {}
-        k = (isotope, element, stereo, hybridization, neighbors, labels)
+        k = (isotope, element, stereo, hybridization, neighbors, engine, labels)
         return self.__weights.get(k) or self.__weights.setdefault(k, get_morgan(self, isotope, element, stereo,
-                                                                                hybridization, neighbors, labels))
+                                                                                hybridization, neighbors, labels,
+                                                                                engine))
+
+    def get_signatures(self, *variants, flush_cache=False):
+        """
+        calculate signatures for several sets of options in single pass.
+        morgan weights calculation and DFS traversal are shared between variants if possible.
+        signatures and morgan weights caches are filled for all variants.
+
+        :param variants: dicts of get_signature options: isotope, stereo, hybridization, neighbors, element, engine
+        :param flush_cache: recalculate signatures if True
+        :return: list of signatures in order of variants
+        """
+        if flush_cache and not self.__frozen or self.__signatures is None:
+            self.__signatures = {}
+
+        keys = [self.__variant(**x) for x in variants]
+        missing = [k for k in dict.fromkeys(keys) if not self.__signatures.get(k)]
+        if missing:
+            traces = {}
+            for k, weights in zip(missing, self.__get_morgans(missing, None, flush_cache)):
+                isotope, element, stereo, hybridization, neighbors, _ = k
+                sg = self._signature_generator(element, isotope, stereo, hybridization, neighbors)
+                trace = traces.get(id(weights))
+                if trace is None:
+                    trace = traces[id(weights)] = sg.traverse(self, weights)
+                self.__signatures[k] = sg(self, weights, trace)
+        return [self.__signatures[k] for k in keys]
+
+    def get_morgans(self, *variants, labels=None, flush_cache=False):
+        """
+        calculate morgan weights for several sets of options in single pass. see get_signatures
+
+        :param variants: dicts of get_morgan options: isotope, element, stereo, hybridization, neighbors, engine
+        :param labels: see get_morgan
+        :param flush_cache: recalculate weights if True
+        :return: list of weights dicts in order of variants
+        """
+        return self.__get_morgans([self.__variant(**x) for x in variants], labels, flush_cache)
+
+    def __get_morgans(self, keys, labels, flush_cache):
+        if flush_cache and not self.__frozen or self.__weights is None:
+            self.__weights = {}
+        missing = [k for k in dict.fromkeys(keys) if not self.__weights.get(k + (labels,))]
+        for engine in {k[-1] for k in missing}:
+            group = [k for k in missing if k[-1] == engine]
+            for k, w in zip(group, get_morgans(self, [k[:-1] for k in group], labels, engine)):
+                self.__weights[k + (labels,)] = w
+        return [self.__weights[k + (labels,)] for k in keys]
+
+    def get_fingerprint(self, length=1024, linear=7, circular=2, bits=2):
+        """
+        hashed fragments fingerprint. see algorithms.fingerprints.get_fingerprint
+
+        :return: NumPy uint64 array
+        """
+        return get_fingerprint(self, length, linear, circular, bits)
+
+    @staticmethod
+    def __variant(isotope=False, element=True, stereo=False, hybridization=False, neighbors=False, engine='primes'):
+        return isotope, element, stereo, hybridization, neighbors, engine
 
     @abstractmethod
     def _signature_generator(self, *args, **kwargs) -> Callable:
@@ -255,6 +473,8 @@ class BaseContainer(Graph, ABC):
         pass
 
     def fix_data(self, copy=False, nodes_bunch=None, edges_bunch=None):
+        if not copy and self.__frozen:
+            _frozen_error()
         g = self.copy() if copy else self
         for a in ((a for _, a in g.nodes(data=True)) if nodes_bunch is None else
                   (g.nodes[x] for x in g.nbunch_iter(nodes_bunch))):
@@ -274,7 +494,60 @@ class BaseContainer(Graph, ABC):
         self.flush_cache()
 
     def flush_cache(self):
-        self.__weights = self.__signatures = self.__pickle = self.__hash = None
+        self.__weights = self.__signatures = self.__pickle = self.__hash = self.__composition = self.__rings = None
+        if self.__views:  # views share atoms and bonds
+            for x in self.__views:
+                x = x()
+                if x is not None and x.is_view:
+                    x.flush_cache()
+
+    def freeze(self):
+        """
+        make structure read-only. signature, hash, atoms, bonds and stereo caches will be precomputed.
+        all modification methods will raise FrozenStructure exception.
+        frozen structure can be shared between threads. other caches filled on demand without flushing.
+
+        Notes: atoms and bonds attributes dictionaries and metadata are not protected. use copy for modifications.
+
+        :return: self
+        """
+        if not self.__frozen:
+            hash(self)
+            repr(self)
+            for n in self:
+                self.atom(n)
+            for n, m in self.edges():
+                self.bond(n, m)
+                self.get_stereo(n, m)
+                self.get_stereo(m, n)
+
+            for x in self.__mutators:
+                setattr(self, x, _frozen_error)
+            self.__frozen = True
+        return self
+
+    @property
+    def is_frozen(self):
+        return self.__frozen
+
+    def __getstate__(self):
+        """
+        mutators stubs and atoms and bonds namedtuples caches are not pickled. frozen structure refrozen on loading
+        """
+        if self.__is_view:  # shared atoms and bonds copied into plain structure
+            return self.copy().__getstate__()
+        state = self.__dict__.copy()
+        for x in self.__mutators:
+            state.pop(x, None)
+        for x in ('__atom_cache', '__bond_cache', '__views'):
+            state.pop('_BaseContainer' + x, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.__frozen:
+            self.__frozen = False
+            self.freeze()
 
     def fresh_copy(self):
         """return a fresh copy graph with the same data structure but without atoms, bonds and metadata.
@@ -304,13 +577,32 @@ class BaseContainer(Graph, ABC):
 
     def __hash__(self):
         if self.__hash is None:
-            self.__hash = int.from_bytes(self.get_signature_hash(isotope=True, stereo=True, hybridization=True,
-                                                                 neighbors=True), 'big')
+            self.__hash = self.get_signature_hash(isotope=True, stereo=True, hybridization=True, neighbors=True,
+                                                  algorithm='blake64')
         return self.__hash
 
     def __eq__(self, other):
+        """
+        layered comparison. atoms and bonds counts, elements composition and already calculated hashes
+        are compared before signatures
+        """
+        if self is other:
+            return True
+        if not isinstance(other, BaseContainer):
+            return str(self) == str(other)
+        if len(self) != len(other) or self.bonds_count != other.bonds_count:
+            return False
+        if self.__hash is not None and other.__hash is not None and self.__hash != other.__hash:
+            return False
+        if self.__get_composition() != other.__get_composition():
+            return False
         return str(self) == str(other)
 
+    def __get_composition(self):
+        if self.__composition is None:
+            self.__composition = Counter(e for _, e in self.nodes(data='element'))
+        return self.__composition
+
     def get_fear_hash(self, *args, **kwargs):
         warn('use get_signature_hash instead', DeprecationWarning)
         return self.get_signature_hash(*args, **kwargs)
@@ -320,7 +612,15 @@ class BaseContainer(Graph, ABC):
         return self.get_signature(*args, **kwargs)
 
     __meta = __visible = __atom_cache = __bond_cache = __weights = __signatures = __pickle = None
-    __hash = None
+    __hash = __composition = __rings = __free = __views = None
+    __frozen = __is_view = False
+    __view_mutators = ('add_node', 'add_nodes_from', 'remove_node', 'remove_nodes_from', 'add_edge', 'add_edges_from',
+                       'add_weighted_edges_from', 'remove_edge', 'remove_edges_from', 'clear', 'update',
+                       'add_stereo', 'fix_data', 'reset_query_marks', 'freeze')
+    __mutators = ('add_node', 'add_nodes_from', 'remove_node', 'remove_nodes_from', 'add_edge', 'add_edges_from',
+                  'add_weighted_edges_from', 'remove_edge', 'remove_edges_from', 'clear', 'update', 'add_atom',
+                  'add_bond', 'delete_atom', 'delete_bond', 'add_stereo', 'flush_cache', 'explicify_hydrogens',
+                  'implicify_hydrogens')
     __attrs = dict(source='atom1', target='atom2', name='atom', link='bonds')
 
     @property
@@ -367,3 +667,7 @@ class BaseContainer(Graph, ABC):
     @abstractmethod
     def _bond_container(cls, *args, **kwargs):
         pass
+
+
+def _frozen_error(*args, **kwargs):
+    raise FrozenStructure('frozen structure can not be modified. use copy')
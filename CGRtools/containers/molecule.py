@@ -19,10 +19,10 @@
 #  MA 02110-1301, USA.
 #
 from collections import namedtuple
-from itertools import chain
+from itertools import chain, repeat
 from .common import BaseContainer
-from ..algorithms import CGRstring, Valence, pyramid_volume
-from ..exceptions import InvalidData, InvalidAtom, InvalidStereo, ValenceError
+from ..algorithms import CGRstring, Valence, pyramid_volume, pyramid_volumes
+from ..exceptions import InvalidData, InvalidAtom, InvalidStereo, ValenceError, FrozenStructure
 from ..periodictable import elements
 
 
@@ -39,7 +39,7 @@ class MoleculeContainer(BaseContainer, Valence):
         if self.__visible is None:
             self.__visible = tmp = super().__dir__()
             tmp.extend([self.explicify_hydrogens.__name__, self.implicify_hydrogens.__name__,
-                        self.atom_implicit_h.__name__, self.reset_query_marks.__name__])
+                        self.atom_implicit_h.__name__, self.reset_query_marks.__name__, self.check_valence.__name__])
         return self.__visible
 
     def pickle(self):
@@ -142,55 +142,90 @@ class MoleculeContainer(BaseContainer, Valence):
 
     def get_stereo(self, atom1, atom2):
         if self.__stereo_cache is None:
-            self.__stereo_cache = {}
-            nodes = list(self.nodes(data=True))
-            while True:
-                failed = []
-                for i, tmp in enumerate(nodes, start=1):
-                    n, attr = tmp
-                    s = attr.get('s_stereo')
-                    if s:
-                        neighbors = list(self.neighbors(n))
-                        len_n = len(neighbors)
-                        if len_n in (3, 4):  # tetrahedron
-                            if attr['s_z'] or any(self.nodes[x]['s_z'] for x in neighbors):
-                                continue  # 3d molecules ignored
-
-                            weights = self.get_morgan(stereo=True)
-                            order = sorted(neighbors, key=weights.get)
-                            for _ in range(len_n):
-                                if (order[0], n) in self.__stereo_cache:
-                                    order.append(order.pop(0))
-                                else:
-                                    failed.append(tmp)
-                                    break
-                            else:
-                                failed.insert(0, tmp)
-                                failed.extend(nodes[i:])
-                                self.__stereo_cache = None
-                                nodes = failed
-                                break
-
-                            if len_n == 4:
-                                zero = self.nodes[order[0]]
-                                zero = (zero['s_x'], zero['s_y'], 1)
-                                first = self.nodes[order[1]]
-                                first = (first['s_x'], first['s_y'], 0)
-                            else:
-                                zero = (attr['s_x'], attr['s_y'], 0)
-                                first = self.nodes[order[0]]
-                                first = (first['s_x'], first['s_y'], 1)
-
-                            second = self.nodes[order[-2]]
-                            third = self.nodes[order[-1]]
-                            vol = pyramid_volume(zero, first,
-                                                 (second['s_x'], second['s_y'], 0), (third['s_x'], third['s_y'], 0))
-
-                            self.__stereo_cache[(n, order[0])] = 1 if vol > 0 and s == 1 or vol < 0 and s == -1 else -1
-                else:
-                    break
+            self.__stereo_cache = self._get_stereo_bonds()
+        return self.__stereo_cache.get((atom1, atom2))
+
+    def flush_cache(self):
+        super().flush_cache()
+        self.__stereo_cache = None
 
-        return self.__stereo_cache.get((atom1, atom2), None)
+    def _get_stereo_bonds(self, label='s', labels=None):
+        """
+        batch calculation of wedge bonds of tetrahedral stereo centers of 2d structure.
+
+        every center gets bond to neighbor with minimal weight, which is not used by this neighbor.
+        conflicts of centers are resolved by reassignment of bonds of previous centers.
+        volumes of all centers calculated in single call.
+
+        :param label: side of structure
+        :param labels: morgan labels. see get_morgan
+        :return: dict of (center, neighbor): wedge mark
+        """
+        lb = '%s_bond' % label
+        ls = '%s_stereo' % label
+        lx = '%s_x' % label
+        ly = '%s_y' % label
+        lz = '%s_z' % label
+
+        weights = None
+        centers = {}
+        for n, attr in self.nodes(data=True):
+            mark = attr.get(ls)
+            if mark:
+                neighbors = [x for x, y in self[n].items() if y.get(lb)]
+                if len(neighbors) in (3, 4):  # tetrahedron
+                    if attr[lz] or any(self.nodes[x][lz] for x in neighbors):
+                        continue  # 3d molecules ignored
+                    if weights is None:
+                        weights = self.get_morgan(stereo=True, labels=labels)
+                    centers[n] = (mark, sorted(neighbors, key=weights.get))
+
+        holders = {}  # bond: (center, index of neighbor in order)
+
+        def assign(n, seen):
+            order = centers[n][1]
+            for i, m in enumerate(order):
+                bond = frozenset((n, m))
+                if bond in seen:
+                    continue
+                seen.add(bond)
+                holder = holders.get(bond)
+                if holder is None or assign(holder[0], seen):
+                    holders[bond] = (n, i)
+                    return True
+            return False
+
+        for n, (_, order) in centers.items():
+            for i, m in enumerate(order):
+                bond = frozenset((n, m))
+                if bond not in holders:
+                    holders[bond] = (n, i)
+                    break
+            else:  # all bonds used by neighbors
+                assign(n, set())
+
+        pyramids, keys = [], []
+        for n, i in holders.values():
+            mark, order = centers[n]
+            order = order[i:] + order[:i]
+            attr = self.nodes[n]
+            if len(order) == 4:
+                zero = self.nodes[order[0]]
+                zero = (zero[lx], zero[ly], 1)
+                first = self.nodes[order[1]]
+                first = (first[lx], first[ly], 0)
+            else:
+                zero = (attr[lx], attr[ly], 0)
+                first = self.nodes[order[0]]
+                first = (first[lx], first[ly], 1)
+
+            second = self.nodes[order[-2]]
+            third = self.nodes[order[-1]]
+            pyramids.append((zero, first, (second[lx], second[ly], 0), (third[lx], third[ly], 0)))
+            keys.append((n, order[0], mark))
+
+        return {(n, m): 1 if vol > 0 and mark == 1 or vol < 0 and mark == -1 else -1
+                for (n, m, mark), vol in zip(keys, pyramid_volumes(pyramids))}
 
     def reset_query_marks(self, copy=False):
         """
@@ -199,6 +234,8 @@ class MoleculeContainer(BaseContainer, Valence):
         :param copy: if True return copy of graph and keep existing as is
         :return: graph if copy True else None
         """
+        if not copy and self.is_frozen:
+            raise FrozenStructure('frozen structure can not be modified. use copy')
         g = self.copy() if copy else self
         b, h, n = 's_bond', 's_hyb', 's_neighbors'
         for i, attr in g.nodes(data=True):
@@ -231,24 +268,24 @@ class MoleculeContainer(BaseContainer, Valence):
         :return: number of removed hydrogens
         """
         explicit = {}
-        c = 0
         for n, attr in self.nodes(data=True):
             if attr['element'] == 'H':
                 m = next(self.neighbors(n))
                 if self.nodes[m]['element'] != 'H':
                     explicit.setdefault(m, []).append(n)
 
+        for_remove = []
         for n, h in explicit.items():
             atom = self.nodes[n]
             implicit = self._get_implicit_h(atom['element'], atom['s_charge'],
                                             [y['s_bond'] for x, y in self[n].items() if x not in h],
                                             radical=atom.get('s_radical', 0))
             if implicit:
-                for x in h:
-                    self.remove_node(x)
-                    c += 1
+                for_remove.extend(h)
+
+        self.remove_nodes_from(for_remove)
         self.flush_cache()
-        return c
+        return len(for_remove)
 
     def explicify_hydrogens(self):
         """
@@ -259,13 +296,35 @@ class MoleculeContainer(BaseContainer, Valence):
         tmp = []
         for n, attr in self.nodes(data=True):
             if attr['element'] != 'H':
-                for _ in range(self.atom_implicit_h(n)):
-                    tmp.append(n)
-        for n in tmp:
-            self.add_bond(n, self.add_atom('H', 0), 1)
+                tmp.extend(repeat((n, self.__h_bond), self.atom_implicit_h(n)))
 
+        return self._add_hydrogens(tmp)
+
+    def _add_hydrogens(self, bonds):
+        """
+        bulk addition of hydrogens. all atoms and bonds added at once without valence checking
+
+        :param bonds: list of (atom, bond attributes) pairs. new hydrogen attached to atom for each pair
+        :return: number of added atoms
+        """
+        start = max(self, default=0) + 1
+        self.add_nodes_from((n, self._hydrogen_attr(n)) for n in range(start, start + len(bonds)))
+        self.add_edges_from((n, m, attr) for m, (n, attr) in enumerate(bonds, start=start))
         self.flush_cache()
-        return len(tmp)
+        return len(bonds)
+
+    @staticmethod
+    def _hydrogen_attr(n):
+        return dict(element='H', s_charge=0, mark='0', s_x=0, s_y=0, s_z=0, map=n)
+
+    def check_valence(self):
+        """
+        check valence of all atoms of structure
+
+        :return: list of ValenceReport(atom, side, element, charge, radical, valence) namedtuples of atoms
+                 with invalid valence. empty list for valid structure
+        """
+        return self._check_valences()
 
     def atom_implicit_h(self, atom):
         attr = self.nodes[atom]
@@ -364,4 +423,5 @@ class MoleculeContainer(BaseContainer, Valence):
     _edge_save = _edge_marks = ('s_bond', 's_stereo')
     _radical_map = {1: 2, 2: 1, 3: 2, None: 0}
     _bond_map = {1: 1, 2: 2, 3: 3, 4: 1.5, 9: 1}
+    __h_bond = dict(s_bond=1)
     __visible = __stereo_cache = None
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2018 Ramil Nugmanov <stsouko@live.ru>
+#  This file is part of CGRtools.
+#
+#  CGRtools is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+
+
+class StructurePool:
+    """storage of unique Molecules or CGRs. equal structures from different reactions or files will be shared"""
+    def __init__(self, numbering=True):
+        """
+        :param numbering: if True structures with same signature but different atoms numbering are not shared.
+            if False atoms numbers of shared structure will be taken from first found structure.
+            useful for solvents and catalysts lists only.
+
+        Notes: shared structures are frozen. coordinates and metadata of first found structure are kept.
+        """
+        self.__numbering = numbering
+        self.__pool = {}
+        self.__hits = 0
+
+    def __call__(self, g):
+        """
+        get shared structure
+
+        :param g: Molecule or CGR container
+        :return: frozen container from pool equal to g. if not found g frozen, stored in pool and returned
+        """
+        k = self.get_key(g)
+        out = self.__pool.get(k)
+        if out is None:
+            self.__pool[k] = out = g.freeze()
+        else:
+            self.__hits += 1
+        return out
+
+    def get_key(self, g):
+        """
+        get pool key of structure. signature hash with atom order if numbering is used
+        """
+        k = (g.__class__.__name__, g.get_signature_hash(isotope=True, stereo=True, hybridization=True,
+                                                        neighbors=True))
+        if self.__numbering:
+            weights = g.get_morgan(isotope=True, stereo=True, hybridization=True, neighbors=True)
+            k += (tuple(sorted(weights.items())),)
+        return k
+
+    @property
+    def numbering(self):
+        """if True shared structures have same atoms numbers as given"""
+        return self.__numbering
+
+    def clear(self):
+        self.__pool.clear()
+        self.__hits = 0
+
+    @property
+    def hits(self):
+        """number of found in pool structures"""
+        return self.__hits
+
+    def __len__(self):
+        return len(self.__pool)
+
+    def __contains__(self, g):
+        return self.get_key(g) in self.__pool
+
+
+__all__ = [StructurePool.__name__]
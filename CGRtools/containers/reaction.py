@@ -21,6 +21,7 @@
 from warnings import warn
 from .cgr import CGRContainer
 from ..algorithms import hash_cgr_string
+from ..exceptions import InvalidConfig
 
 
 class MindfulList:
@@ -132,12 +133,34 @@ class ReactionContainer:
                     products=[x.pickle() for x in self.__products], reactants=[x.pickle() for x in self.__reactants])
 
     @staticmethod
-    def unpickle(data):
-        """convert json serializable reaction into ReactionContainer object instance"""
-        return ReactionContainer(reagents=[CGRContainer.unpickle(x) for x in
-                                           (data['reagents'] if 'reagents' in data else data['substrats'])],
-                                 products=[CGRContainer.unpickle(x) for x in data['products']], meta=data['meta'],
-                                 reactants=[CGRContainer.unpickle(x) for x in data.get('reactants', [])])
+    def unpickle(data, pool=None):
+        """
+        convert json serializable reaction into ReactionContainer object instance
+
+        :param pool: StructurePool object with numbering. if not None, molecules will be shared with other reactions
+        """
+        reaction = ReactionContainer(reagents=[CGRContainer.unpickle(x) for x in
+                                               (data['reagents'] if 'reagents' in data else data['substrats'])],
+                                     products=[CGRContainer.unpickle(x) for x in data['products']],
+                                     reactants=[CGRContainer.unpickle(x) for x in data.get('reactants', [])],
+                                     meta=data['meta'])
+        if pool is not None:
+            reaction.intern(pool)
+        return reaction
+
+    def intern(self, pool):
+        """
+        replace molecules in reaction by equal molecules shared by pool
+
+        :param pool: StructurePool object with numbering. otherwise atoms mapping of reaction will be broken
+        """
+        if not pool.numbering:
+            raise InvalidConfig('pool without numbering can not be used for reactions')
+        for ml in (self.__reagents, self.__reactants, self.__products):
+            for n, m in enumerate(ml):
+                x = pool(m)
+                if x is not m:
+                    ml[n] = x
 
     @property
     def substrats(self):  # reverse compatibility
@@ -174,16 +197,17 @@ class ReactionContainer:
                               products=[x.copy() for x in self.__products],
                               reactants=[x.copy() for x in self.__reactants])
 
-    def get_signature_hash(self, *args, **kwargs):
+    def get_signature_hash(self, *args, algorithm=None, **kwargs):
         """
-        get 40bytes hash of signature string. see get_signature
+        get hash of signature string. see get_signature
 
-        :return: bytes
+        :param algorithm: hash algorithm. see hash_cgr_string
+        :return: bytes or int
         """
-        return hash_cgr_string(self.get_signature(*args, **kwargs))
+        return hash_cgr_string(self.get_signature(*args, **kwargs), algorithm)
 
     def get_signature(self, isotope=False, stereo=False, hybridization=False, neighbors=False, element=True,
-                      flush_cache=False, hyb=False):
+                      flush_cache=False, hyb=False, engine='primes'):
         """
         return string representation of reaction with molecules
         in order same as in lists of reagents, reactants, products.
@@ -196,6 +220,7 @@ class ReactionContainer:
         :param element: set elements marks and charges of atoms
         :param flush_cache: recalculate signature if True
         :param hyb: deprecated. see hybridization arg
+        :param engine: morgan algorithm engine. see algorithms.morgan.get_morgan
         """
         if hyb:
             warn('attr hyb is deprecated, use hybridization instead', DeprecationWarning)
@@ -205,7 +230,7 @@ class ReactionContainer:
                                                            (self.__reagents, self.__reactants, self.__products)):
             self.__signatures = {}
 
-        k = (isotope, element, stereo, hybridization, neighbors)
+        k = (isotope, element, stereo, hybridization, neighbors, engine)
         out = self.__signatures.get(k)
         if not out:
             sig = []
@@ -213,7 +238,7 @@ class ReactionContainer:
                 ms = []
                 for m in ml:
                     mol = m.get_signature(isotope=isotope, stereo=stereo, hybridization=hybridization,
-                                          neighbors=neighbors, element=element)
+                                          neighbors=neighbors, element=element, engine=engine)
                     ms.append('{%s}' % mol if isinstance(mol, CGRContainer) else str(mol))
                 sig.append('.'.join(ms))
             self.__signatures[k] = out = '>'.join(sig)
@@ -274,16 +299,17 @@ class MergedReaction:
         """
         return self.__class__(self.reagents.copy(), self.products.copy(), self.meta.copy())
 
-    def get_signature_hash(self, *args, **kwargs):
+    def get_signature_hash(self, *args, algorithm=None, **kwargs):
         """
-        get 40bytes hash of signature string. see get_signature
+        get hash of signature string. see get_signature
 
-        :return: bytes
+        :param algorithm: hash algorithm. see hash_cgr_string
+        :return: bytes or int
         """
-        return hash_cgr_string(self.get_signature(*args, **kwargs))
+        return hash_cgr_string(self.get_signature(*args, **kwargs), algorithm)
 
     def get_signature(self, isotope=False, stereo=False, hybridization=False, neighbors=False, element=True,
-                      flush_cache=False, hyb=False):
+                      flush_cache=False, hyb=False, engine='primes'):
         """
         return string representation of reaction with unique atoms and molecules order
         CAUTION: if reaction contains CGRs. signature will be unobvious
@@ -295,6 +321,7 @@ class MergedReaction:
         :param element: set elements marks and charges of atoms
         :param flush_cache: recalculate signature if True
         :param hyb: deprecated. see hybridization arg
+        :param engine: morgan algorithm engine. see algorithms.morgan.get_morgan
         """
         if hyb:
             warn('attr hyb is deprecated, use hybridization instead', DeprecationWarning)
@@ -303,13 +330,13 @@ class MergedReaction:
         if flush_cache or self.__signatures is None:
             self.__signatures = {}
 
-        k = (isotope, element, stereo, hybridization, neighbors)
+        k = (isotope, element, stereo, hybridization, neighbors, engine)
         out = self.__signatures.get(k)
         if not out:
             r = self.reagents.get_signature(isotope=isotope, stereo=stereo, hybridization=hybridization,
-                                            neighbors=neighbors, element=element)
+                                            neighbors=neighbors, element=element, engine=engine)
             p = self.products.get_signature(isotope=isotope, stereo=stereo, hybridization=hybridization,
-                                            neighbors=neighbors, element=element)
+                                            neighbors=neighbors, element=element, engine=engine)
             self.__signatures[k] = out = '%s>>%s' % ('{%s}' % r if isinstance(self.reagents, CGRContainer) else r,
                                                      '{%s}' % p if isinstance(self.products, CGRContainer) else p)
         return out
@@ -27,8 +27,16 @@ from .exceptions import InvalidData
 
 class CGRcore:
     @staticmethod
-    def split(m, meta=False):
-        return [m.substructure(c, meta=meta) for c in connected_components(m)]
+    def split(m, meta=False, view=False):
+        """
+        split disjoint graph to connected components
+
+        :param m: Molecule or CGR Container
+        :param meta: copy metadata to components
+        :param view: return components as views. see substructure method of containers
+        :return: list of Molecule or CGR Containers
+        """
+        return [m.substructure(c, meta=meta, view=view) for c in connected_components(m)]
 
     @classmethod
     def union(cls, m1, m2):
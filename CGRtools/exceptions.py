@@ -48,6 +48,10 @@ class FinalizedFile(Exception):
     pass
 
 
+class FrozenStructure(Exception):
+    pass
+
+
 class MapError(Exception):
     pass
 
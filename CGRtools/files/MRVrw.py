@@ -51,9 +51,9 @@ def xml_dict(parent_element):
 
 
 class MRVread(CGRread, WithMixin):
-    def __init__(self, file, remap=True, ignore=False, is_template=False):
+    def __init__(self, file, remap=True, ignore=False, is_template=False, pool=None):
         WithMixin.__init__(self, file, 'rb')
-        CGRread.__init__(self, remap, ignore, is_template=is_template)
+        CGRread.__init__(self, remap, ignore, is_template=is_template, pool=pool)
         self.__data = self.__reader()
         self.__ignore = ignore
 
@@ -67,10 +67,18 @@ class WithMixin:
 
 
 class CGRread:
-    def __init__(self, remap=True, ignore=False, is_template=False):
+    def __init__(self, remap=True, ignore=False, is_template=False, pool=None):
+        """
+        :param remap: renumber atoms without gaps
+        :param ignore: ignore mapping errors
+        :param is_template: parse reactions as CGRTemplates
+        :param pool: StructurePool object. if not None, equal molecules will be shared between records.
+            reactions molecules are shared only if pool keeps atoms numbering
+        """
         self.__remap = remap
         self.__ignore = ignore
         self.__is_template = is_template
+        self.__pool = pool
 
     def _get_reaction(self, reaction):
         spmaps = None
@@ -144,6 +152,8 @@ class CGRread:
                 remapped = {x: y for x, y in enumerate(maps[i][shift: atom_len + shift], start=1)}
                 shift += atom_len
                 g = self.__parse_molecule(j, remapped, colors=colors[next(counter)])
+                if self.__pool is not None and self.__pool.numbering:  # atoms numbers are reaction mapping
+                    g = self.__pool(g)
                 rc[i].append(g)
         return rc
 
@@ -164,7 +174,10 @@ class CGRread:
                     remapped[k] = (m, m)
                     used.append(m)
 
-        return self.__parse_molecule(molecule, remapped, meta=molecule['meta'], colors=molecule['colors'])
+        g = self.__parse_molecule(molecule, remapped, meta=molecule['meta'], colors=molecule['colors'])
+        if self.__pool is not None and not g.meta:  # molecules with metadata are unique records
+            g = self.__pool(g)
+        return g
 
     @classmethod
     def __parsedyn(cls, name, value):
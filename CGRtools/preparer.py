@@ -19,6 +19,9 @@
 #  MA 02110-1301, USA.
 #
 from functools import reduce
+from itertools import islice
+from multiprocessing import Pool
+from os import cpu_count
 from warnings import warn
 from .containers import MoleculeContainer, ReactionContainer, MergedReaction
 from .core import CGRcore
@@ -233,7 +236,7 @@ class CGRpreparer(CGRcore):
 
 class CGRstandardizer(CGRreactor):
     """CGR standardization and reaction balancing"""
-    def __init__(self, templates, balance_groups=False, **kwargs):
+    def __init__(self, templates, balance_groups=False, cache=None, **kwargs):
         """
         :param templates: CGRTemplates. rules for graph modifications. possible be False
         :param balance_groups: if True: for unbalanced reactions contains multiple attached functional groups in
@@ -249,6 +252,8 @@ class CGRstandardizer(CGRreactor):
 
                 R + B1-X1 + B2-X2 -> B'1-R'-B'2 + X'1 + X'2
 
+        :param cache: utils.cache.MatchCache object. if not None, patches applied to equal structures are reused.
+            cache can be shared between standardizers with different templates
         :param kwargs: see CGRreactor init
         """
         super().__init__(**kwargs)
@@ -258,6 +263,9 @@ class CGRstandardizer(CGRreactor):
         if templates:
             self.__searcher = self.get_template_searcher(self.prepare_templates(templates))
             self.__searching = True
+            if cache is not None:
+                self.__cache = cache
+                self.__library = cache.get_library_key(self.pickle())
 
     def pickle(self):
         """ return config. for pickling
@@ -276,34 +284,86 @@ class CGRstandardizer(CGRreactor):
         templates = [ReactionContainer.unpickle(x) for x in config.pop('templates')]
         return cls(templates, **config)
 
-    def prepare(self, g, copy=False):
-        if copy:
-            g = g.copy()
-
-        report = []
-        if self.__balance_groups:
-            g = self.clone_subgraphs(g)
+    def prepare(self, g, copy=None):
+        """
+        apply templates to structure until no matches found. patches are applied in place to copy of structure.
+        after first search only neighborhoods of patched atoms are searched.
+        if cache is used, patches of equal structure found in cache are applied without searching
 
-        while self.__searching:
-            searcher = self.__searcher(g)
-            first_match = next(searcher, None)
-            if not first_match:
+        :param g: CGRContainer
+        :param copy: deprecated. structure is always copied
+        :return: standardized copy of structure
+        """
+        if copy is not None:
+            warn('copy argument of prepare is deprecated. structure is always copied', DeprecationWarning)
+        h = self.clone_subgraphs(g) if self.__balance_groups else g
+        g = h.copy()
+        if not self.__searching:
+            return g
+
+        if self.__cache is not None:
+            k = self.__cache.get_key(h, self.__library)
+            cached = self.__cache.get(k, h)
+            if cached is not None:
+                patches, report = cached
+                for patch in patches:
+                    self.patcher(g, patch, inplace=True)
                 if report:
                     g.graph.setdefault('CGR_REPORT', []).extend(report)
-                break
+                return g
 
-            g = CGRreactor.patcher(g, first_match.patch)
-            if 'CGR_TEMPLATE' in first_match.meta:
-                report.append(first_match.meta['CGR_TEMPLATE'])
-
-            for match in searcher:
-                g = CGRreactor.patcher(g, match.patch)
+        patches = []
+        report = []
+        changed = None
+        while True:
+            patched = set()
+            for match in self.__searcher(g, atoms=changed):
+                self.patcher(g, match.patch, inplace=True)
+                patches.append(match.patch)
+                patched.update(match.patch)
+                patched.update(match.mapping)  # skipped intersected matches can be placed around unpatched atoms
                 if 'CGR_TEMPLATE' in match.meta:
                     report.append(match.meta['CGR_TEMPLATE'])
+
+            if not patched:
+                break
+            changed = patched
+
+        if self.__cache is not None:
+            self.__cache.put(k, h, patches, report)
+        if report:
+            g.graph.setdefault('CGR_REPORT', []).extend(report)
         return g
 
+    def prepare_many(self, data, workers=None, chunk=64, ordered=True):
+        """
+        standardize many structures in pool of processes. standardizer is unpickled once per process.
+        cache is not used in processes
+
+        :param data: iterable of CGRContainers. for example RDFread of CGRs
+        :param workers: number of processes. if None number of CPUs used. if 1 structures processed in current process
+        :param chunk: number of structures sent to process at once
+        :param ordered: if True results returned in order of data, otherwise in order of completion
+        :return: generator of standardized structures. see prepare
+        """
+        if workers == 1:
+            for g in data:
+                yield self.prepare(g)
+            return
+
+        workers = workers or cpu_count() or 1
+        data = iter(data)
+        with Pool(workers, _init_standardizer, (self.pickle(),)) as pool:
+            mapper = pool.imap if ordered else pool.imap_unordered
+            while True:  # data consumed by batches. unlimited streams are acceptable
+                batch = list(islice(data, chunk * workers * 4))
+                if not batch:
+                    break
+                yield from mapper(_prepare, batch, chunk)
+
     __searcher = None
     __searching = False
+    __cache = None
 
 
 class CGRcombo:  # Reverse compatibility
@@ -333,4 +393,13 @@ class CGRbalancer:  # Reverse compatibility
         return CGRstandardizer.unpickle(*args, **kwargs)
 
 
+def _init_standardizer(config):
+    global _standardizer
+    _standardizer = CGRstandardizer.unpickle(config)
+
+
+def _prepare(g):
+    return _standardizer.prepare(g)
+
+
 __all__ = [CGRpreparer.__name__, CGRstandardizer.__name__]
@@ -18,15 +18,16 @@
 #  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #  MA 02110-1301, USA.
 #
+from collections import Counter, defaultdict
 from functools import reduce
-from itertools import product, combinations
-from networkx import compose, has_path
-from networkx.algorithms.isomorphism import (GraphMatcher, categorical_node_match, generic_node_match,
-                                             categorical_edge_match)
+from itertools import chain, combinations
+from networkx import compose, number_connected_components
 from warnings import warn
+from .algorithms.fingerprints import get_fragments
+from .algorithms.isomorphism import SubgraphMatcher, MultiSubgraphMatcher
 from .containers import CGRTemplate, MatchContainer, CGRContainer
 from .core import CGRcore
-from .exceptions import InvalidConfig, InvalidData, InvalidTemplate
+from .exceptions import InvalidConfig, InvalidData, InvalidTemplate, FrozenStructure
 
 
 class CGRreactor:
@@ -55,13 +56,9 @@ class CGRreactor:
             gnm_s.append('s_stereo')
             cnm_p.append('p_stereo')
 
-        self.__node_match = generic_node_match(gnm_sp, [None] * len(gnm_sp), [self.__list_eq] * len(gnm_sp))
-        self.__node_match_reagents = generic_node_match(gnm_s, [None] * len(gnm_s), [self.__list_eq] * len(gnm_s))
-        self.__node_match_products = categorical_node_match(cnm_p, [None] * len(cnm_p))
-
-        self.__edge_match = generic_node_match('sp_bond', None, self.__list_eq)
-        self.__edge_match_reagents = generic_node_match('s_bond', None, self.__list_eq)
-        self.__edge_match_products = categorical_edge_match('p_bond', None)
+        self.__node_match = tuple(gnm_sp)
+        self.__node_match_reagents = tuple(gnm_s)
+        self.__node_match_products = tuple(cnm_p)
 
         self.__pickle = dict(stereo=stereo, extralabels=extralabels, isotope=isotope, element=element)
 
@@ -79,35 +76,156 @@ class CGRreactor:
             raise InvalidConfig('Invalid config')
         return cls(**config)
 
-    def get_cgr_matcher(self, g, h):
+    def get_cgr_matcher(self, g, h, automorphic=True):
         if not isinstance(g, CGRContainer):
-            nm = self.__node_match_reagents
-            em = self.__edge_match_reagents
-        else:
-            nm = self.__node_match
-            em = self.__edge_match
+            return SubgraphMatcher(g, h, self.__node_match_reagents, ('s_bond',), automorphic=automorphic)
+        return SubgraphMatcher(g, h, self.__node_match, ('sp_bond',), automorphic=automorphic)
+
+    def get_multi_matcher(self, patterns, cgr=True, automorphic=True):
+        """
+        matcher of many patterns in single structure traversal
 
-        return GraphMatcher(g, h, node_match=nm, edge_match=em)
+        :param patterns: list of CGRContainers
+        :param cgr: matcher for CGRs if True else for Molecules
+        :param automorphic: if False only one mapping for each set of structure atoms generated
+        :return: MultiSubgraphMatcher
+        """
+        if cgr:
+            return MultiSubgraphMatcher(patterns, self.__node_match, ('sp_bond',), automorphic=automorphic)
+        return MultiSubgraphMatcher(patterns, self.__node_match_reagents, ('s_bond',), automorphic=automorphic)
+
+    def get_template_searcher(self, templates, screening=True, fragments=0, automorphic=False):
+        """
+        :param templates: list of CGRTemplates. see prepare_templates
+        :param screening: match only templates which elements, charges and bonds requirements satisfied by structure
+        :param fragments: maximal number of atoms in linear fragments of templates additionally used for screening.
+                          0 - disabled
+        :param automorphic: if True all mappings of templates generated. otherwise mappings equal up to symmetry of
+                            template pattern are pruned. only one mapping for each set of structure atoms generated
+        :return: searcher function
+        """
+        templates = list(templates)
+        indexes = {}
+        matchers = {}
+
+        def candidates(g, cgr):
+            index = indexes.get(cgr)
+            if index is None:
+                index = indexes[cgr] = self.__get_templates_index(templates, cgr, fragments)
+            anchors, free = index
+
+            keys = self.__get_requirements(g, cgr)
+            g_fragments = None
+            found = set()
+            for i, requirements, t_fragments in chain(free, (x for k in anchors.keys() & keys for x in anchors[k])):
+                if any(keys[k] < c for k, c in requirements.items()):
+                    continue
+                if t_fragments:
+                    if g_fragments is None:
+                        g_fragments = self.__get_fragments(g, cgr, fragments)
+                    if not t_fragments.issubset(g_fragments):
+                        continue
+                found.add(i)
+            return found
+
+        # connected patterns matches are placed in neighborhood of any matched atom
+        radius = max((len(x.pattern) - 1 for x in templates), default=0)
+        if any(number_connected_components(x.pattern) > 1 for x in templates):
+            radius = None
+
+        def searcher(g, skip_intersection=True, atoms=None):
+            """
+            :param g: structure
+            :param skip_intersection: skip matches intersected with previous matches
+            :param atoms: if not None only matches close to given atoms are searched.
+                after applying of previous search results all new matches are found if atoms contain
+                all matched and patched atoms of previous search
+            """
+            cgr = isinstance(g, CGRContainer)
+            h = g if atoms is None or radius is None else g.subgraph(self.__get_neighborhood(g, atoms, radius))
+            subset = candidates(h, cgr) if screening else None
+            if subset is not None and not subset:
+                return
+
+            matcher = matchers.get(cgr)
+            if matcher is None:
+                matcher = matchers[cgr] = self.get_multi_matcher([x.pattern for x in templates], cgr, automorphic)
 
-    def get_template_searcher(self, templates):
-        def searcher(g, skip_intersection=True):
             if skip_intersection:
                 found = set()
 
-            for i in templates:
-                gm = self.get_cgr_matcher(g, i.pattern)
-                for j in gm.subgraph_isomorphisms_iter():
-                    matched_atoms = set(j)
-                    if skip_intersection:
-                        if found.intersection(matched_atoms):
-                            continue
-                        else:
-                            found.update(matched_atoms)
+            for i, j in matcher.subgraph_isomorphisms_iter(h, subset):
+                if skip_intersection:
+                    if found.intersection(j):
+                        continue
+                    else:
+                        found.update(j)
 
-                    yield MatchContainer(j, self.__remap_group(i.patch, g, {y: x for x, y in j.items()})[0], i.meta)
+                t = templates[i]
+                yield MatchContainer(j, self.__remap_group(t.patch, g, {y: x for x, y in j.items()})[0], t.meta)
 
         return searcher
 
+    @staticmethod
+    def __get_neighborhood(g, atoms, radius):
+        seen = set(atoms).intersection(g)
+        layer = seen
+        for _ in range(radius):
+            layer = {m for n in layer for m in g[n] if m not in seen}
+            if not layer:
+                break
+            seen.update(layer)
+        return seen
+
+    def __get_templates_index(self, templates, cgr, fragments):
+        """
+        templates grouped by rarest requirement
+        """
+        data = []
+        for t in templates:
+            data.append((self.__get_requirements(t.pattern, cgr, True),
+                         self.__get_fragments(t.pattern, cgr, fragments, True) if fragments else None))
+
+        frequency = Counter(k for x, _ in data for k in x)
+        anchors = defaultdict(list)
+        free = []
+        for i, (requirements, t_fragments) in enumerate(data):
+            if requirements:
+                anchors[min(requirements, key=frequency.get)].append((i, requirements, t_fragments))
+            else:
+                free.append((i, requirements, t_fragments))
+        return dict(anchors), free
+
+    def __get_requirements(self, g, cgr, query=False):
+        """
+        multiset of elements, elements with charges and bonds of structure. query values with lists or None ignored
+        """
+        element = self.__pickle['element']
+        charge, bond = ('sp_charge', 'sp_bond') if cgr else ('s_charge', 's_bond')
+        out = Counter()
+        if element:
+            for _, attr in g.nodes(data=True):
+                e, c = attr.get('element'), attr.get(charge)
+                if not query or self.__is_fixed(e):
+                    out['e', e] += 1
+                    if not query or self.__is_fixed(c):
+                        out['a', e, c] += 1
+        for *_, b in g.edges(data=bond):
+            if not query or self.__is_fixed(b):
+                out['b', b] += 1
+        return out
+
+    def __get_fragments(self, g, cgr, fragments, query=False):
+        if cgr:
+            return get_fragments(g, fragments, -1, atom_marks=self.__node_match, bond_marks=('sp_bond',),
+                                 query=query)
+        return get_fragments(g, fragments, -1, atom_marks=self.__node_match_reagents, bond_marks=('s_bond',),
+                             query=query)
+
+    @staticmethod
+    def __is_fixed(x):
+        return x is not None and not isinstance(x, list)
+
     @classmethod
     def __split_graph(cls, g):
         g = g.copy()
@@ -123,13 +241,22 @@ class CGRreactor:
             g.remove_edge(n, l)
             g.remove_edge(n, m)
 
+        # atoms connected to lost bonds. removing of bonds out of these atoms doesn't change it
+        reached = {y for x in lost_bonds for y in x}
+        stack = list(reached)
+        while stack:
+            for x in g[stack.pop()]:
+                if x not in reached:
+                    reached.add(x)
+                    stack.append(x)
+
         for n, m in list(cls.__get_broken_paths(g)):
-            if not any(has_path(g, *x) for x in product((y for x in lost_bonds for y in x), (n, m))):
+            if n not in reached and m not in reached:
                 g.remove_edge(n, m)
                 term_atoms.append(n)
                 term_atoms.append(m)
 
-        return CGRcore.split(g), lost_bonds, term_atoms
+        return CGRcore.split(g, view=True), lost_bonds, term_atoms
 
     @staticmethod
     def __get_substitution_paths(g):
@@ -187,10 +314,14 @@ class CGRreactor:
         ''' search similar R groups and patch.
         '''
         tmp = g
+        term_atoms = set(term_atoms)
+        r_group = [(k, j, self.__get_products_composition(j)) for k, j in r_group]
         for i in newcomponents:
-            for k, j in r_group:
-                gm = GraphMatcher(j, i, node_match=self.__node_match_products,
-                                  edge_match=self.__edge_match_products)
+            composition = self.__get_products_composition(i)
+            for k, j, r_composition in r_group:
+                if any(r_composition[x] < c for x, c in composition.items()):  # component can't be subgraph of group
+                    continue
+                gm = SubgraphMatcher(j, i, self.__node_match_products, ('p_bond',), query=False)
                 ''' search for similar R-groups started from bond breaks.
                 '''
                 mapping = next((x for x in gm.subgraph_isomorphisms_iter() if k.issubset(x) and
@@ -213,9 +344,14 @@ class CGRreactor:
 
         return tmp.copy()
 
-    @staticmethod
-    def __list_eq(a, b):
-        return True if b is None else a in b if isinstance(b, list) else a == b
+    def __get_products_composition(self, g):
+        """
+        multiset of compared in products atoms and bonds marks
+        """
+        marks = self.__node_match_products
+        out = Counter(tuple(attr.get(x) for x in marks) for _, attr in g.nodes(data=True))
+        out.update(('bond', b) for *_, b in g.edges(data='p_bond'))
+        return out
 
     @staticmethod
     def __simple_eq(a, b):
@@ -224,7 +360,8 @@ class CGRreactor:
     @staticmethod
     def __remap_group(g, h, mapping):
         newmap = mapping.copy()
-        newmap.update({x: y for x, y in zip(set(g).difference(newmap), set(range(1, 1000)).difference(h))})
+        new = set(g).difference(newmap)
+        newmap.update(zip(new, h.get_free_numbers(len(new))))
         return g.remap(newmap, copy=True), newmap
 
     @staticmethod
@@ -279,27 +416,47 @@ class CGRreactor:
         return templates
 
     @staticmethod
-    def patcher(structure, patch):
+    def patcher(structure, patch, inplace=False):
         """
         remove edges bw common nodes. add edges from template and replace nodes data
 
         :param structure: MoleculeContainer or CGRContainer
         :param patch: MoleculeContainer or CGRContainer with replacement data
+        :param inplace: if True only patched atoms and bonds of structure changed. structure returned.
+            otherwise new structure created. frozen structures and views can not be patched inplace
         """
+        if inplace:  # check before any changes
+            if structure.is_frozen:
+                raise FrozenStructure('frozen structure can not be patched inplace. use copy')
+            if structure.is_view:
+                raise InvalidData('view can not be patched inplace. use copy')
+
         node_marks = ['s_charge', 's_hyb', 's_neighbors', 's_stereo', 'element', 'map', 'mark']
         bond_marks = ['s_bond', 's_stereo']
         if isinstance(structure, CGRContainer):
             node_marks.extend(('p_charge', 'p_hyb', 'p_neighbors', 'p_stereo'))
             bond_marks.extend(('p_bond', 'p_stereo'))
 
-        p = structure.fresh_copy()
-        for i, attr in patch.nodes(data=True):
-            p.add_node(i, **{x: y[structure.nodes[i][x]] if isinstance(y, dict) else y
-                             for x, y in attr.items() if x in node_marks})
+        atoms = [(i, {x: y[structure.nodes[i][x]] if isinstance(y, dict) else y
+                      for x, y in attr.items() if x in node_marks}) for i, attr in patch.nodes(data=True)]
+        bonds = [(m, n, {x: y[structure[m][n][x]] if isinstance(y, dict) else y
+                         for x, y in attr.items() if x in bond_marks}) for m, n, attr in patch.edges(data=True)]
 
-        for m, n, attr in patch.edges(data=True):
-            p.add_edge(m, n, **{x: y[structure[m][n][x]] if isinstance(y, dict) else y
-                                for x, y in attr.items() if x in bond_marks})
+        if inplace:
+            common = set(patch).intersection(structure)
+            for i, attr in atoms:
+                if i in common:
+                    structure.nodes[i].update(attr)
+                else:
+                    structure.add_node(i, **attr)
+            structure.remove_edges_from(combinations(common, 2))
+            structure.add_edges_from(bonds)
+            structure.flush_cache()
+            return structure
+
+        p = structure.fresh_copy()
+        p.add_nodes_from(atoms)
+        p.add_edges_from(bonds)
 
         s = structure.copy()
         s.remove_edges_from(combinations(set(patch).intersection(structure), 2))
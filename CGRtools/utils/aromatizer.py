@@ -29,7 +29,10 @@ class Aromatizer(CGRreactor):
             self.__visible = [self.get.__name__]
         return self.__visible
 
-    def __init__(self):
+    def __init__(self, cache=None):
+        """
+        :param cache: MatchCache object. if not None, patches applied to equal structures are reused
+        """
         CGRreactor.__init__(self)
         p = Path(__file__).parent
         with (p / 'aromatize.rdf').open() as f_a, (p / 'dearomatize.rdf').open() as f_d:
@@ -37,34 +40,43 @@ class Aromatizer(CGRreactor):
             raw_templates_d = RDFread(f_d, is_template=True).read()
         self.__searcher_a = self.get_template_searcher(self.prepare_templates(raw_templates_a))
         self.__searcher_d = self.get_template_searcher(self.prepare_templates(raw_templates_d))
+        if cache is not None:
+            self.__cache = cache
+            self.__library = cache.get_library_key(dict(aromatize=[x.pickle() for x in raw_templates_a],
+                                                        dearomatize=[x.pickle() for x in raw_templates_d]))
 
     def __call__(self, g):
-        flag = False
-        while True:  # dearomatize pyroles (furans, thiophenes) and quinones
-            searcher = self.__searcher_d(g)
-            match = next(searcher, None)
-            if not match:
-                break
+        if not g.get_rings().rings:  # all templates are cyclic
+            return g, False
 
-            flag = True
-            g = self.patcher(g, match.patch)
+        if self.__cache is not None:
+            k = self.__cache.get_key(g, self.__library)
+            cached = self.__cache.get(k, g)
+            if cached is not None:
+                patches, _ = cached
+                for patch in patches:
+                    g = self.patcher(g, patch)
+                return g, bool(patches)
+            origin = g
 
-            for match in searcher:
-                g = self.patcher(g, match.patch)
+        patches = []
+        # dearomatize pyroles (furans, thiophenes) and quinones. then aromatize benzenes
+        for searcher in (self.__searcher_d, self.__searcher_a):
+            while True:
+                found = False
+                for match in searcher(g):
+                    found = True
+                    g = self.patcher(g, match.patch)
+                    patches.append(match.patch)
+                if not found:
+                    break
 
-        while True:  # aromatize benzenes
-            searcher = self.__searcher_a(g)
-            match = next(searcher, None)
-            if not match:
-                return g, flag
-
-            flag = True
-            g = self.patcher(g, match.patch)
-
-            for match in searcher:
-                g = self.patcher(g, match.patch)
+        if self.__cache is not None:
+            self.__cache.put(k, origin, patches)
+        return g, bool(patches)
 
     def get(self, *args, **kwargs):
         return self.__call__(*args, **kwargs)
 
     __visible = None
+    __cache = None
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2018 Ramil Nugmanov <stsouko@live.ru>
+#  This file is part of CGRtools.
+#
+#  CGRtools is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+from collections import OrderedDict
+from hashlib import sha256
+from json import dumps
+from os.path import exists
+from pickle import dump, load, HIGHEST_PROTOCOL
+from ..algorithms.isomorphism import SubgraphMatcher
+from ..containers import CGRContainer
+from ..exceptions import InvalidConfig
+
+
+class MatchCache:
+    """LRU storage of templates patches applied to structures.
+    equal structures from different reactions or files are patched without templates searching.
+
+    patches are stored with atoms numbers of first found structure and remapped to numbers of equal structures.
+    new atoms of patches take lowest free numbers of structure.
+    """
+    def __init__(self, maxsize=10000, path=None):
+        """
+        :param maxsize: maximal number of stored structures. least recently used structures are evicted
+        :param path: if not None, cache is loaded from given file if exists. see save method
+        """
+        if maxsize < 1:
+            raise InvalidConfig('maxsize should be positive')
+        self.__maxsize = maxsize
+        self.__path = path
+        self.__cache = OrderedDict()
+        self.__hits = self.__misses = 0
+
+        if path is not None and exists(path):
+            with open(path, 'rb') as f:
+                self.__cache.update(load(f))
+            while len(self.__cache) > maxsize:
+                self.__cache.popitem(last=False)
+
+    def get(self, k, g):
+        """
+        get stored patches of structure
+
+        :param k: cache key of structure. see get_key
+        :param g: Molecule or CGR container
+        :return: tuple of remapped to g patches and stored data or None if not found
+        """
+        value = self.__cache.get(k)
+        if value is not None:
+            origin, order, patches, data = value
+            mapping = self.__get_mapping(g, origin, order)
+            if mapping is not None:  # signature hash collisions and unhashed attributes are possible
+                self.__cache.move_to_end(k)
+                self.__hits += 1
+                new = {n for x in patches for n in x}.difference(mapping)
+                mapping.update(zip(sorted(new), g.get_free_numbers(len(new))))
+                return [x.remap({n: mapping[n] for n in x}, copy=True) for x in patches], data
+
+        self.__misses += 1
+
+    def put(self, k, g, patches, data=None):
+        """
+        store patches of structure
+
+        :param k: cache key of structure. see get_key
+        :param g: Molecule or CGR container before patching. copy of structure is stored
+        :param patches: list of patches in applying order. should not be changed after storing
+        :param data: any additional picklable data. for example templates report
+        """
+        self.__cache[k] = (g.copy(), self.__get_order(g), patches, data)
+        self.__cache.move_to_end(k)
+        if len(self.__cache) > self.__maxsize:
+            self.__cache.popitem(last=False)
+
+    @staticmethod
+    def get_key(g, library):
+        """
+        get cache key of structure. templates library fingerprint and signature hash of structure
+
+        :param library: templates library fingerprint. see get_library_key
+        """
+        return library, g.__class__.__name__, g.get_signature_hash(isotope=True, stereo=True)
+
+    @staticmethod
+    def get_library_key(config):
+        """
+        get templates library fingerprint
+
+        :param config: json serializable templates and options. for example CGRstandardizer.pickle()
+        """
+        return sha256(dumps(config, sort_keys=True, default=repr).encode()).hexdigest()
+
+    def save(self, path=None):
+        """
+        dump cache into file
+
+        :param path: file path. if None path of init used
+        """
+        path = path or self.__path
+        if path is None:
+            raise InvalidConfig('path required')
+        with open(path, 'wb') as f:
+            dump(list(self.__cache.items()), f, HIGHEST_PROTOCOL)
+
+    def clear(self):
+        self.__cache.clear()
+        self.__hits = self.__misses = 0
+
+    @property
+    def hits(self):
+        """number of found in cache structures"""
+        return self.__hits
+
+    @property
+    def misses(self):
+        """number of not found in cache structures"""
+        return self.__misses
+
+    @property
+    def maxsize(self):
+        return self.__maxsize
+
+    def __len__(self):
+        return len(self.__cache)
+
+    @staticmethod
+    def __get_order(g):
+        """
+        atoms in order of signature string
+        """
+        weights = g.get_morgan(isotope=True, stereo=True)
+        trace = g._signature_generator(True, True, True, False, False).traverse(g, weights)
+        return [x for tokens in trace for x in tokens if not isinstance(x, (str, tuple))]
+
+    @classmethod
+    def __get_mapping(cls, g, h, h_order):
+        """
+        mapping of h atoms to g atoms. atoms in same positions of equal signatures strings are mapped.
+        """
+        if isinstance(g, CGRContainer):
+            node_marks, edge_marks = cls.__cgr_marks
+        else:
+            node_marks, edge_marks = cls.__molecule_marks
+
+        order = cls.__get_order(g)
+        if len(order) == len(h_order):
+            mapping = dict(zip(h_order, order))
+            gn = g.nodes
+            if g.number_of_edges() == h.number_of_edges() and \
+                    all(attr.get(x) == gn[mapping[n]].get(x) for n, attr in h.nodes(data=True) for x in node_marks) and \
+                    all(g.has_edge(mapping[n], mapping[m]) and
+                        all(attr.get(x) == g[mapping[n]][mapping[m]].get(x) for x in edge_marks)
+                        for n, m, attr in h.edges(data=True)):
+                return mapping
+
+        mapping = next(SubgraphMatcher(g, h, node_marks, edge_marks, query=False).subgraph_isomorphisms_iter(), None)
+        if mapping is not None:
+            return {y: x for x, y in mapping.items()}
+
+    __cgr_marks = (('element', 'isotope', 's_charge', 'p_charge', 's_radical', 'p_radical', 's_stereo', 'p_stereo',
+                    's_hyb', 'p_hyb', 's_neighbors', 'p_neighbors'), ('s_bond', 'p_bond', 's_stereo', 'p_stereo'))
+    __molecule_marks = (('element', 'isotope', 's_charge', 's_radical', 's_stereo', 's_hyb', 's_neighbors'),
+                        ('s_bond', 's_stereo'))
+
+
+__all__ = [MatchCache.__name__]
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2018 Ramil Nugmanov <stsouko@live.ru>
+#  This file is part of CGRtools.
+#
+#  CGRtools is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+"""
+hydrogens explicit/implicit conversion for streams of molecules, CGRs and reactions
+"""
+from ..containers import ReactionContainer
+
+
+def explicify_hydrogens(data, copy=False):
+    """
+    add explicit hydrogens to all structures in stream
+
+    :param data: iterable of Molecule, CGR or Reaction containers. e.g. SDFread or RDFread objects
+    :param copy: if True structures will be copied before modification
+    :return: generator of modified structures
+    """
+    return _process(data, copy, 'explicify_hydrogens')
+
+
+def implicify_hydrogens(data, copy=False):
+    """
+    remove explicit hydrogens from all structures in stream. see explicify_hydrogens
+    """
+    return _process(data, copy, 'implicify_hydrogens')
+
+
+def _process(data, copy, method):
+    for x in data:
+        if copy:
+            x = x.copy()
+        if isinstance(x, ReactionContainer):
+            for m in x.reagents:
+                getattr(m, method)()
+            for m in x.reactants:
+                getattr(m, method)()
+            for m in x.products:
+                getattr(m, method)()
+            x.flush_cache()
+        else:
+            getattr(x, method)()
+        yield x
+
+
+__all__ = [explicify_hydrogens.__name__, implicify_hydrogens.__name__]
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2018 Ramil Nugmanov <stsouko@live.ru>
+#  This file is part of CGRtools.
+#
+#  CGRtools is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+from importlib.util import find_spec
+from struct import Struct
+from ..algorithms import iter_fingerprint_batch, get_fingerprint_batch
+from ..exceptions import InvalidConfig, InvalidData
+
+
+class SimilarityIndex:
+    """Tanimoto similarity search over hashed fragments fingerprints of Molecules and CGRs.
+    see algorithms.fingerprints.
+
+    index file contains header with fingerprints options and rows of fingerprint words and bits count.
+    file is memory-mapped on loading.
+    """
+    def __init__(self, path):
+        """
+        load index created by create method
+
+        :param path: path to index file
+        """
+        if _np is None:
+            raise InvalidConfig('NumPy required for similarity search')
+
+        with open(path, 'rb') as f:
+            header = f.read(self.__header.size)
+            empty = not f.read(8)
+        if len(header) != self.__header.size:
+            raise InvalidData('invalid index file')
+        magic, length, linear, circular, bits = self.__header.unpack(header)
+        if magic != self.__magic:
+            raise InvalidData('invalid index file')
+
+        self.__words = length // 64
+        self.__config = dict(length=length, linear=linear, circular=circular, bits=bits)
+        if empty:  # empty files can't be mapped
+            self.__data = _np.zeros((0, self.__words + 1), dtype=_np.uint64)
+        else:
+            self.__data = _np.memmap(path, dtype=_np.uint64, mode='r',
+                                     offset=self.__header.size).reshape(-1, self.__words + 1)
+
+    @classmethod
+    def create(cls, path, graphs, chunk=1024, length=1024, linear=7, circular=2, bits=2):
+        """
+        calculate fingerprints of structures and write index file
+
+        :param path: path to index file
+        :param graphs: iterable of (CGR|Molecule)Containers. for example RDFread or SDFread.
+                       rows of index are equal to order of structures
+        :param chunk: number of structures processed in batch
+        :param length,linear,circular,bits: fingerprints options. see algorithms.fingerprints.get_fingerprint
+        :return: SimilarityIndex
+        """
+        with open(path, 'wb') as f:
+            f.write(cls.__header.pack(cls.__magic, length, linear, circular, bits))
+            for fps in iter_fingerprint_batch(graphs, chunk, length, linear, circular, bits):
+                _np.column_stack((fps, _popcount(fps).astype(_np.uint64))).tofile(f)
+        return cls(path)
+
+    @property
+    def config(self):
+        """fingerprints options of index"""
+        return self.__config.copy()
+
+    @property
+    def fingerprints(self):
+        """memory-mapped array of fingerprints"""
+        return self.__data[:, :self.__words]
+
+    def __len__(self):
+        return len(self.__data)
+
+    def search(self, query, k=None, threshold=None, chunk=None):
+        """
+        find similar structures
+
+        :param query: (CGR|Molecule)Container or NumPy uint64 fingerprint with options of index
+        :param k: number of best hits. if None all hits above threshold returned
+        :param threshold: minimal Tanimoto similarity of hits
+        :param chunk: number of index rows processed in batch
+        :return: list of (row, similarity) tuples ordered by similarity
+        """
+        return self.search_batch([query], k, threshold, chunk)[0]
+
+    def search_batch(self, queries, k=None, threshold=None, chunk=None):
+        """
+        find similar structures for many queries in single pass over index. see search
+
+        :return: list of search results in order of queries
+        """
+        if k is None and threshold is None:
+            raise InvalidConfig('k or threshold required')
+
+        queries = self.__prepare(queries)
+        if not len(queries):
+            return []
+        if chunk is None:  # limit intermediate arrays by ~64MB
+            chunk = max(1, (1 << 23) // (len(queries) * self.__words))
+
+        q_counts = _popcount(queries)
+        hits = [([_np.zeros(0, dtype=int)], [_np.zeros(0)]) for _ in queries]
+        for start in range(0, len(self.__data), chunk):
+            data = _np.asarray(self.__data[start:start + chunk])
+            fps, counts = data[:, :self.__words], data[:, self.__words].astype(_np.int64)
+
+            common = _popcount(_np.bitwise_and(queries[:, None, :], fps[None, :, :]))
+            union = q_counts[:, None] + counts[None, :] - common
+            sims = _np.divide(common, union, out=_np.zeros(union.shape), where=union > 0)
+
+            for (rows, values), s in zip(hits, sims):
+                if threshold is not None:
+                    idx = _np.flatnonzero(s >= threshold)
+                    if k is not None and len(idx) > k:
+                        idx = idx[_np.argpartition(s[idx], -k)[-k:]]
+                elif len(s) > k:
+                    idx = _np.argpartition(s, -k)[-k:]
+                else:
+                    idx = _np.arange(len(s))
+                rows.append(idx + start)
+                values.append(s[idx])
+
+            if k is not None:  # keep only k best candidates
+                for i, (rows, values) in enumerate(hits):
+                    rows, values = _np.concatenate(rows), _np.concatenate(values)
+                    if len(rows) > k:
+                        idx = _np.argpartition(values, -k)[-k:]
+                        rows, values = rows[idx], values[idx]
+                    hits[i] = ([rows], [values])
+
+        out = []
+        for rows, values in hits:
+            rows, values = _np.concatenate(rows), _np.concatenate(values)
+            order = _np.lexsort((rows, -values))
+            out.append(list(zip(rows[order].tolist(), values[order].tolist())))
+        return out
+
+    def __prepare(self, queries):
+        queries = list(queries)
+        graphs = [(i, x) for i, x in enumerate(queries) if not isinstance(x, _np.ndarray)]
+        if graphs:
+            fps = get_fingerprint_batch([x for _, x in graphs], **self.__config)
+            for (i, _), fp in zip(graphs, fps):
+                queries[i] = fp
+        if not queries:
+            return _np.zeros((0, self.__words), dtype=_np.uint64)
+
+        queries = _np.array(queries, dtype=_np.uint64).reshape(len(queries), -1)
+        if queries.shape[1] != self.__words:
+            raise InvalidData('fingerprint length not equal to index')
+        return queries
+
+    __header = Struct('<8s4q')
+    __magic = b'CGRFP001'
+
+
+def _popcount(x):
+    """bits count of last axis of uint64 array"""
+    if hasattr(_np, 'bitwise_count'):  # NumPy >= 2.0
+        return _np.bitwise_count(x).sum(axis=-1, dtype=_np.int64)
+    return _bytes_bits[x.view(_np.uint8)].sum(axis=-1, dtype=_np.int64)
+
+
+if find_spec('numpy'):
+    import numpy as _np
+    _bytes_bits = _np.array([bin(x).count('1') for x in range(256)], dtype=_np.uint8)
+else:
+    _np = None
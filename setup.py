@@ -36,7 +36,7 @@ setup(
     entry_points={'console_scripts': ['cgrtools=CGRtools.CLI:launcher']},
     package_data={'CGRtools.utils': ['aromatize.rdf', 'dearomatize.rdf']},
     install_requires=['networkx>=2.0,<2.1', 'lxml>=4.1.1,<4.2'],
-    extras_require={'autocomplete': ['argcomplete'], 'sphinx': ['sphinx>=1.6']},
+    extras_require={'autocomplete': ['argcomplete'], 'sphinx': ['sphinx>=1.6'], 'fingerprints': ['numpy']},
     long_description=(Path(__file__).parent / 'README.md').open().read(),
     keywords="tools cgr cli",
     classifiers=['Environment :: Console',
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2018 Ramil Nugmanov <stsouko@live.ru>
+#  This file is part of CGRtools.
+#
+#  CGRtools is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+from pathlib import Path
+from pickle import dumps, loads
+from unittest import TestCase, main
+from CGRtools.exceptions import FrozenStructure
+from CGRtools.files import RDFread
+from CGRtools.preparer import CGRpreparer
+
+
+class TestFrozenPickle(TestCase):
+    def setUp(self):
+        with (Path(__file__).parent / 'condenser.rdf').open() as f:
+            self.reactions = RDFread(f).read()
+
+    def check(self, g):
+        g.freeze()
+        x = loads(dumps(g))
+        self.assertTrue(x.is_frozen)
+        self.assertEqual(str(x), str(g))
+        self.assertEqual(hash(x), hash(g))
+        self.assertEqual([x.atom(n) for n in x], [g.atom(n) for n in g])
+        with self.assertRaises(FrozenStructure):
+            x.add_bond(*list(x)[:2], 1)
+        y = x.copy()
+        y.remove_node(next(iter(y)))
+        self.assertEqual(len(y), len(x) - 1)
+
+    def test_molecule(self):
+        for r in self.reactions:
+            for m in r.reagents + r.products:
+                self.check(m.copy())
+
+    def test_cgr(self):
+        preparer = CGRpreparer()
+        for r in self.reactions:
+            self.check(preparer.condense(r))
+
+    def test_view(self):
+        for r in self.reactions:
+            for m in r.reagents + r.products:
+                m = m.copy()
+                v = m.substructure(list(m)[:3], view=True)
+                s = str(v)
+                x = loads(dumps(v))
+                self.assertFalse(x.is_view)
+                self.assertEqual(str(x), s)
+                m.delete_atom(list(m)[1])
+                self.assertNotEqual(str(v), s)
+
+
+if __name__ == '__main__':
+    main()
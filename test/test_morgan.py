@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2018 Ramil Nugmanov <stsouko@live.ru>
+#  This file is part of CGRtools.
+#
+#  CGRtools is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+from pathlib import Path
+from random import Random
+from unittest import TestCase, main
+from CGRtools.files import RDFread
+
+
+class TestCanonicalEngine(TestCase):
+    def setUp(self):
+        with (Path(__file__).parent / 'condenser.rdf').open() as f:
+            self.molecules = [m for r in RDFread(f).read() for m in r.reagents + r.products]
+
+    def test_renumbered(self):
+        random = Random(1)
+        for m in self.molecules:
+            atoms = list(m)
+            x = m.remap(dict(zip(atoms, random.sample(range(1, 3 * len(atoms)), len(atoms)))), copy=True)
+            self.assertEqual(x.get_signature(stereo=True, engine='canonical'),
+                             m.get_signature(stereo=True, engine='canonical'))
+            self.assertEqual(len(set(m.get_morgan(engine='canonical').values())), len(m))
+
+    def test_default_unchanged(self):
+        for m in self.molecules:
+            a, b = m.copy(), m.copy()
+            h, s = hash(a), str(a)
+            a.get_signature(isotope=True, stereo=True, hybridization=True, neighbors=True, engine='canonical')
+            self.assertEqual(hash(a), h)
+            self.assertEqual(str(a), s)
+            self.assertEqual(a, b)
+            self.assertEqual(len({a, b}), 1)
+
+
+if __name__ == '__main__':
+    main()